@@ -0,0 +1,78 @@
+"""Benchmark a full vault parse with a cold versus a warm parse cache.
+
+Generates a synthetic vault, then times ``parse_vault`` three ways: without a
+cache, with an empty cache (cold, which also fills it) and with the filled
+cache (warm, as in a rebuild of an unchanged vault).
+
+Run from ``backend/``::
+
+    python benchmarks/parse_cache.py --files 2000 --tasks 40
+"""
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from markado.parse_cache import ParseCache
+from markado.parser import parse_vault
+
+NOTE_TEMPLATE = """---
+project: Project {n}
+tags: [work, notes]
+aliases:
+  - Note {n}
+---
+
+# Note {n}
+
+Some prose that the parser has to skip over before it reaches the tasks.
+"""
+
+
+def make_vault(root: Path, files: int, tasks: int) -> None:
+    """Write ``files`` notes with ``tasks`` task lines each under ``root``."""
+    for n in range(files):
+        folder = root / f"area{n % 20}"
+        folder.mkdir(parents=True, exist_ok=True)
+        lines = [NOTE_TEMPLATE.format(n=n)]
+        for t in range(tasks):
+            status = "x" if t % 3 == 0 else " "
+            lines.append(
+                f"- [{status}] Task {t} of note {n} #tag{t % 7} "
+                f"[priority:: {t % 5}] 📅 2026-01-{t % 28 + 1:02d}"
+            )
+        (folder / f"note{n}.md").write_text("\n".join(lines), encoding="utf-8")
+
+
+def time_parse(vault: Path, cache: ParseCache | None) -> tuple[float, int]:
+    """Parse the whole vault; returns elapsed seconds and tasks seen."""
+    start = time.perf_counter()
+    count = sum(len(parsed.tasks) for _, parsed in parse_vault(vault, cache))
+    return time.perf_counter() - start, count
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--files", type=int, default=1000)
+    arg_parser.add_argument("--tasks", type=int, default=40)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        vault = Path(tmp) / "vault"
+        make_vault(vault, args.files, args.tasks)
+        cache = ParseCache(Path(tmp) / "cache", max_bytes=1024**3)
+
+        uncached, count = time_parse(vault, None)
+        cold, _ = time_parse(vault, cache)
+        warm, _ = time_parse(vault, cache)
+
+        print(f"{args.files} files, {count} tasks, cache {cache.size / 1024:.0f} KiB")
+        print(f"no cache:   {uncached:8.3f}s")
+        print(f"cold cache: {cold:8.3f}s")
+        print(f"warm cache: {warm:8.3f}s  ({uncached / warm:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Benchmark multi-tag filtering: serialised tags versus the tag index.
+
+Builds a shard with random tags per task, then times a filter over common
+tags (``#work AND #urgent NOT #waiting``) and one over rare tags, fetching
+the first page of ids as ``GET /tasks/`` does, three ways:
+
+* ``serialised``: tags stored as a ``" #a #b "`` string column and matched
+  with ``LIKE``, which has to scan and string-match every row;
+* ``indexed``: the ``tag``/``task_tag`` tables through ``tag_filter_clause``;
+* ``bitmaps``: the in-memory bitsets kept for hot tags.
+
+Run from ``backend/``::
+
+    python benchmarks/tag_filter.py --tasks 200000 --repeat 20
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from sqlmodel import Session, SQLModel, col, select
+
+from markado.database import make_engine
+from markado.models import Tag, Task, TaskTag
+from markado.tags import TagBitmaps, TagFilter, tag_filter_clause
+
+TAGS = ["work", "urgent", "waiting", "home", "errand", "idea", "read", "call"]
+# Chance of each tag being on a task; "work" and "urgent" are common.
+WEIGHTS = [0.5, 0.2, 0.1, 0.3, 0.1, 0.02, 0.005, 0.1]
+FILTERS = {
+    # Common tags: many tasks match.
+    "#work AND #urgent NOT #waiting": (
+        TagFilter(all_of=["work", "urgent"], none_of=["waiting"]),
+        "tags LIKE '% #work %' AND tags LIKE '% #urgent %' "
+        "AND tags NOT LIKE '% #waiting %'",
+    ),
+    # Rare tags: few tasks match, so a scan has to read the whole table.
+    "#idea AND #read": (
+        TagFilter(all_of=["idea", "read"]),
+        "tags LIKE '% #idea %' AND tags LIKE '% #read %'",
+    ),
+}
+
+
+def build(path: Path, tasks: int, seed: int) -> None:
+    """Fill a shard file with ``tasks`` tagged tasks, stored both ways."""
+    rng = random.Random(seed)
+    engine = make_engine(path)
+    SQLModel.metadata.create_all(engine)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "CREATE TABLE task_serialised (id INTEGER PRIMARY KEY, tags VARCHAR)"
+        )
+        connection.execute(
+            Tag.__table__.insert(),  # type: ignore[attr-defined]
+            [{"id": i + 1, "name": name} for i, name in enumerate(TAGS)],
+        )
+        task_rows, link_rows, serialised_rows = [], [], []
+        for task_id in range(1, tasks + 1):
+            picked = [i for i, w in enumerate(WEIGHTS) if rng.random() < w]
+            task_rows.append({"id": task_id, "name": f"Task {task_id}"})
+            link_rows.extend({"task_id": task_id, "tag_id": i + 1} for i in picked)
+            tag_text = " ".join(f"#{TAGS[i]}" for i in picked)
+            serialised_rows.append({"id": task_id, "tags": f" {tag_text} "})
+        connection.execute(Task.__table__.insert(), task_rows)  # type: ignore[attr-defined]
+        connection.execute(TaskTag.__table__.insert(), link_rows)  # type: ignore[attr-defined]
+        connection.exec_driver_sql(
+            "INSERT INTO task_serialised (id, tags) VALUES (:id, :tags)",
+            serialised_rows,
+        )
+    engine.dispose()
+
+
+def time_query(query: Callable[[], list[int]], repeat: int) -> tuple[float, list[int]]:
+    """Best-of-``repeat`` seconds for ``query``, and its result."""
+    best, result = float("inf"), []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = query()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(
+    session: Session, tag_filter: TagFilter, where: str, limit: int, repeat: int
+) -> dict[str, tuple[float, list[int]]]:
+    """Time one filter all three ways."""
+    bitmaps = TagBitmaps(threshold=1)
+    connection = session.connection()
+
+    def serialised() -> list[int]:
+        rows = connection.exec_driver_sql(
+            f"SELECT id FROM task_serialised WHERE {where} ORDER BY id LIMIT {limit}"
+        )
+        return [row[0] for row in rows]
+
+    def indexed() -> list[int]:
+        statement = (
+            select(Task.id)
+            .where(tag_filter_clause(session, tag_filter))
+            .order_by(col(Task.id))
+            .limit(limit)
+        )
+        return [task_id for task_id in session.exec(statement) if task_id]
+
+    def from_bitmaps() -> list[int]:
+        task_ids = bitmaps.task_ids(session, "bench", tag_filter, 0, limit)
+        assert task_ids is not None
+        return task_ids
+
+    return {
+        "serialised": time_query(serialised, repeat),
+        "indexed": time_query(indexed, repeat),
+        # The first call loads the bitmaps, as the first hot-tag query would.
+        "bitmap load": time_query(from_bitmaps, 1),
+        "bitmaps": time_query(from_bitmaps, repeat),
+    }
+
+
+def main() -> None:
+    """Run the benchmark and print a small report."""
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--tasks", type=int, default=100_000)
+    arg_parser.add_argument("--limit", type=int, default=100)
+    arg_parser.add_argument("--repeat", type=int, default=10)
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "shard.db"
+        build(path, args.tasks, args.seed)
+        engine = make_engine(path)
+        print(f"{args.tasks} tasks, first {args.limit} matches")
+        with Session(engine) as session:
+            for label, (tag_filter, where) in FILTERS.items():
+                results = run(session, tag_filter, where, args.limit, args.repeat)
+                expected = results["serialised"][1]
+                print(f"{label} ({len(expected)} found)")
+                for name, (elapsed, ids) in results.items():
+                    check = "ok" if ids == expected else "MISMATCH"
+                    print(f"  {name:>11}: {elapsed * 1000:8.2f} ms  {check}")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -29,6 +29,20 @@ if config.config_file_name is not None:
 
 target_metadata = SQLModel.metadata
 
+# SQLite can't ALTER most things in place, so have autogenerate emit batch
+# operations, and commit after each revision so a long upgrade doesn't hold
+# the write lock for its whole run. See markado.backfill for large backfills.
+configure_options = {
+    "render_as_batch": True,
+    "transaction_per_migration": True,
+}
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    """Keep autogenerate away from the backfill bookkeeping table."""
+    return not (type_ == "table" and name == "backfill_progress")
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -53,6 +67,8 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
+        **configure_options,
     )
 
     with context.begin_transaction():
@@ -66,6 +82,19 @@ def run_migrations_online() -> None:
     and associate a connection with the context.
 
     """
+    # markado.shards passes its own connection to migrate a vault shard.
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            **configure_options,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+        return
+
     connectable = engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
@@ -73,7 +102,12 @@ def run_migrations_online() -> None:
     )
 
     with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            include_object=include_object,
+            **configure_options,
+        )
 
         with context.begin_transaction():
             context.run_migrations()
@@ -0,0 +1,41 @@
+"""Add file_path and line_number columns to Task
+
+Revision ID: 8c69c17c8c78
+Revises: 97f5cf46a3e4
+Create Date: 2026-10-19 14:03:52.118406
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8c69c17c8c78"
+down_revision: str | Sequence[str] | None = "97f5cf46a3e4"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable columns, so SQLite adds them in place without copying the table.
+    # Existing tasks came from the API and have no source file to backfill.
+    with op.batch_alter_table("task") as batch_op:
+        batch_op.add_column(
+            sa.Column("file_path", sqlmodel.sql.sqltypes.AutoString(), nullable=True)
+        )
+        batch_op.add_column(sa.Column("line_number", sa.Integer(), nullable=True))
+        batch_op.create_index(
+            batch_op.f("ix_task_file_path"), ["file_path"], unique=False
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("task") as batch_op:
+        batch_op.drop_index(batch_op.f("ix_task_file_path"))
+        batch_op.drop_column("line_number")
+        batch_op.drop_column("file_path")
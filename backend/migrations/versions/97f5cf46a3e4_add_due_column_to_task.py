@@ -0,0 +1,30 @@
+"""Add due column to Task
+
+Revision ID: 97f5cf46a3e4
+Revises: cec445bd269a
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "97f5cf46a3e4"
+down_revision: str | Sequence[str] | None = "cec445bd269a"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("task", sa.Column("due", sa.Date(), nullable=True))
+    op.create_index("ix_task_complete_due", "task", ["complete", "due"], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_task_complete_due", table_name="task")
+    op.drop_column("task", "due")
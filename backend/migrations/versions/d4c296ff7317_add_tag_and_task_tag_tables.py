@@ -0,0 +1,55 @@
+"""Add tag and task_tag tables
+
+Revision ID: d4c296ff7317
+Revises: 8c69c17c8c78
+Create Date: 2026-10-19 14:05:10.537921
+
+"""
+
+from collections.abc import Sequence
+
+import sqlalchemy as sa
+import sqlmodel
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "d4c296ff7317"
+down_revision: str | Sequence[str] | None = "8c69c17c8c78"
+branch_labels: str | Sequence[str] | None = None
+depends_on: str | Sequence[str] | None = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "tag",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_tag_name"), "tag", ["name"], unique=True)
+    op.create_table(
+        "task_tag",
+        sa.Column("task_id", sa.Integer(), nullable=False),
+        sa.Column("tag_id", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["tag_id"],
+            ["tag.id"],
+        ),
+        sa.ForeignKeyConstraint(
+            ["task_id"],
+            ["task.id"],
+        ),
+        sa.PrimaryKeyConstraint("task_id", "tag_id"),
+    )
+    op.create_index(
+        "ix_task_tag_tag_id_task_id", "task_tag", ["tag_id", "task_id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_task_tag_tag_id_task_id", table_name="task_tag")
+    op.drop_table("task_tag")
+    op.drop_index(op.f("ix_tag_name"), table_name="tag")
+    op.drop_table("tag")
@@ -0,0 +1,137 @@
+"""Agenda of open tasks due in the next N days, bucketed by day.
+
+Each shard's answer is cached per day. The cache belongs to one calendar day
+and is dropped when the date changes, so "today" is never stale. Writes drop
+just the days a task was due on before and after the change.
+
+In "ipc" mode the cache is off: writes are applied by the writer process,
+so a worker's cache would not see writes made through other workers.
+"""
+
+import threading
+from collections.abc import Iterable
+from datetime import date, timedelta
+
+from markado import services
+from markado.database import WRITER_MODE
+from markado.models import AgendaDay, TaskPublic
+from markado.shards import Shard, ShardRegistry, fan_out
+
+
+class AgendaCache:
+    """Per-shard, per-day buckets of open tasks, valid for a single day."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._today: date | None = None
+        self._buckets: dict[tuple[str, date], list[TaskPublic]] = {}
+        # Bumped by every invalidation, so a query that raced a write doesn't
+        # store its (possibly stale) result.
+        self._generations: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def generation(self, shard_name: str) -> int:
+        """Current invalidation counter of ``shard_name``."""
+        with self._lock:
+            return self._generations.get(shard_name, 0)
+
+    def get_many(
+        self, shard_name: str, days: list[date], today: date
+    ) -> dict[date, list[TaskPublic]]:
+        """Return the cached buckets among ``days``; missing days are omitted."""
+        with self._lock:
+            self._roll_over(today)
+            return {
+                day: self._buckets[(shard_name, day)]
+                for day in days
+                if (shard_name, day) in self._buckets
+            }
+
+    def put_many(
+        self,
+        shard_name: str,
+        buckets: dict[date, list[TaskPublic]],
+        today: date,
+        generation: int,
+    ) -> None:
+        """Store buckets queried when the shard was at ``generation``."""
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._generations.get(shard_name, 0) != generation:
+                return
+            self._roll_over(today)
+            for day, tasks in buckets.items():
+                self._buckets[(shard_name, day)] = tasks
+
+    def invalidate(
+        self, shard_name: str, days: Iterable[date | None] | None = None
+    ) -> None:
+        """Forget the buckets of the given due dates in one shard (all if None)."""
+        with self._lock:
+            self._generations[shard_name] = self._generations.get(shard_name, 0) + 1
+            if days is None:
+                for key in [k for k in self._buckets if k[0] == shard_name]:
+                    del self._buckets[key]
+                return
+            for day in days:
+                if day is not None:
+                    self._buckets.pop((shard_name, day), None)
+
+    def clear(self) -> None:
+        """Forget everything."""
+        with self._lock:
+            self._buckets.clear()
+
+    def _roll_over(self, today: date) -> None:
+        if today != self._today:
+            self._buckets.clear()
+            self._today = today
+
+
+cache = AgendaCache(enabled=WRITER_MODE != "ipc")
+
+
+def shard_agenda(
+    shard: Shard, days: list[date], today: date, agenda_cache: AgendaCache = cache
+) -> dict[date, list[TaskPublic]]:
+    """Buckets for ``days`` in one shard, querying only uncached days."""
+    generation = agenda_cache.generation(shard.name)
+    buckets = agenda_cache.get_many(shard.name, days, today)
+    missing = [day for day in days if day not in buckets]
+    if not missing:
+        return buckets
+
+    # One range scan covering every missing day; days in between that were
+    # already cached are simply refreshed.
+    start, end = missing[0], missing[-1] + timedelta(days=1)
+    fresh: dict[date, list[TaskPublic]] = {
+        start + timedelta(days=i): [] for i in range((end - start).days)
+    }
+    with shard.read_session() as session:
+        for task in services.list_due_tasks(session, start, end):
+            assert task.due is not None
+            fresh[task.due].append(shard.public(task))
+    agenda_cache.put_many(shard.name, fresh, today, generation)
+    return {**buckets, **fresh}
+
+
+def agenda(
+    registry: ShardRegistry,
+    days: int,
+    today: date | None = None,
+    agenda_cache: AgendaCache = cache,
+) -> list[AgendaDay]:
+    """Open tasks due from today for ``days`` days, one entry per day."""
+    today = today or date.today()
+    window = [today + timedelta(days=i) for i in range(days)]
+    per_shard = fan_out(
+        registry, lambda shard: shard_agenda(shard, window, today, agenda_cache)
+    )
+    result = []
+    for day in window:
+        tasks = [task for buckets in per_shard for task in buckets[day]]
+        if len(per_shard) > 1:
+            tasks.sort(key=lambda task: task.id)
+        result.append(AgendaDay(day=day, tasks=tasks))
+    return result
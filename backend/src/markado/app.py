@@ -3,19 +3,31 @@ import os
 from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI, HTTPException, Query
-from sqlmodel import Session
+from fastapi import Depends, FastAPI, HTTPException, Query, Request
+from fastapi.responses import JSONResponse
 
-from markado import services
+from markado import agenda, jobs, query, shards
 
-from .database import get_session, init_db
+from .database import init_db
 from .models import (
-    Task,
+    AgendaDay,
+    JobPublic,
+    QueryExplain,
     TaskCreate,
     TaskPublic,
+    TaskStats,
     TaskUpdate,
 )
 from .setup_logging import setup_logging
+from .shards import ShardRegistry, get_shards
+from .tags import TagFilter
+from .writer import (
+    TaskWriter,
+    WriterError,
+    get_task_writer,
+    start_writer,
+    stop_writer,
+)
 
 
 @asynccontextmanager
@@ -24,17 +36,28 @@ async def lifespan(app: FastAPI):
     load_dotenv()
     setup_logging()
     init_db()
+    get_shards()
+    start_writer()
+    jobs.start_jobs()
     logger = logging.getLogger(__name__)
     logger.info(f"PP_ENV: {os.getenv('PP_ENV')}")
     logger.info(f"PORT: {os.getenv('PORT')}")
     yield
 
     # Shutdown code (if any)
+    jobs.stop_jobs()
+    stop_writer()
 
 
 app = FastAPI(lifespan=lifespan)
 
 
+@app.exception_handler(WriterError)
+async def writer_error_handler(request: Request, exc: WriterError) -> JSONResponse:
+    """Report a failed or unreachable writer as 503, which clients may retry."""
+    return JSONResponse(status_code=503, content={"detail": str(exc)})
+
+
 # def hash_password(password):
 # return f"hashed_{password}"
 
@@ -44,19 +67,109 @@ async def root() -> dict[str, str]:
     return {"status": "ok"}
 
 
+@app.get("/stats", response_model=TaskStats)
+def stats_endpoint(registry: ShardRegistry = Depends(get_shards)) -> TaskStats:
+    """Return task counts across all vaults."""
+    return shards.task_stats(registry)
+
+
+@app.get("/agenda", response_model=list[AgendaDay])
+def agenda_endpoint(
+    registry: ShardRegistry = Depends(get_shards),
+    days: int = Query(default=7, ge=1, le=366),
+) -> list[AgendaDay]:
+    """Return open tasks due in the next ``days`` days, grouped by day."""
+    return agenda.agenda(registry, days)
+
+
+@app.get("/query", response_model=list[TaskPublic] | QueryExplain)
+def query_endpoint(
+    q: str,
+    explain: bool = False,
+    registry: ShardRegistry = Depends(get_shards),
+) -> list[TaskPublic] | QueryExplain:
+    """Run a Dataview-style task query, or show SQLite's plan for it."""
+    try:
+        if explain:
+            return query.explain(registry, q)
+        return query.run_query(registry, q)
+    except query.QueryError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+@app.post("/resync", response_model=JobPublic, status_code=202)
+def resync_endpoint(
+    vault: str | None = None,
+    writer: TaskWriter = Depends(get_task_writer),
+    registry: ShardRegistry = Depends(get_shards),
+) -> JobPublic:
+    """Queue a reindex of one vault (all if omitted) and return its job.
+
+    If an equivalent resync is already queued or running, that job is
+    returned instead of starting another.
+    """
+    if vault is not None and vault not in registry:
+        raise HTTPException(status_code=404, detail="Vault not found")
+    targets = [registry.get(vault)] if vault is not None else list(registry)
+    if all(shard.vault_dir is None for shard in targets):
+        raise HTTPException(
+            status_code=409, detail="No vault directory to resync (see VAULT_DIRS)"
+        )
+    return writer.start_resync(vault)
+
+
+@app.get("/jobs/{job_id}", response_model=JobPublic)
+def get_job_endpoint(
+    job_id: str, writer: TaskWriter = Depends(get_task_writer)
+) -> JobPublic:
+    """Report a job's status, progress, throughput and ETA."""
+    job = writer.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobPublic)
+def cancel_job_endpoint(
+    job_id: str, writer: TaskWriter = Depends(get_task_writer)
+) -> JobPublic:
+    """Stop a job; files already written stay indexed."""
+    job = writer.cancel_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 @app.get("/tasks/", response_model=list[TaskPublic])
 def list_tasks_endpoint(
-    session: Session = Depends(get_session),
-    offset: int = 0,
-    limit: int = Query(default=100, le=100),
-) -> list[Task]:
-    """Return a paginated list of tasks."""
-    return services.list_tasks(session, offset=offset, limit=limit)
+    registry: ShardRegistry = Depends(get_shards),
+    offset: int = Query(default=0, ge=0),
+    limit: int = Query(default=100, ge=0, le=100),
+    q: str | None = None,
+    tag: list[str] = Query(default=[]),
+    any_tag: list[str] = Query(default=[]),
+    not_tag: list[str] = Query(default=[]),
+) -> list[TaskPublic]:
+    """Return a paginated list of tasks, optionally filtered by name and tags.
+
+    Tasks must have every ``tag``, at least one ``any_tag`` and no ``not_tag``,
+    e.g. ``?tag=work&tag=urgent&not_tag=waiting``.
+    """
+    if len(registry) > 1 and offset > shards.MAX_FANOUT_OFFSET:
+        raise HTTPException(
+            status_code=422,
+            detail=f"offset above {shards.MAX_FANOUT_OFFSET} is not supported "
+            "across several vaults",
+        )
+    tag_filter = TagFilter(all_of=tag, any_of=any_tag, none_of=not_tag)
+    return shards.list_tasks(
+        registry, offset=offset, limit=limit, q=q, tag_filter=tag_filter
+    )
 
 
 @app.get("/tasks/{task_id}", response_model=TaskPublic)
-def get_task_endpoint(task_id: int, session: Session = Depends(get_session)):
-    task = services.get_task(session, task_id)
+def get_task_endpoint(task_id: int, registry: ShardRegistry = Depends(get_shards)):
+    task = shards.get_task(registry, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
     return task
@@ -64,14 +177,21 @@ def get_task_endpoint(task_id: int, session: Session = Depends(get_session)):
 
 @app.post("/tasks/", response_model=TaskPublic)
 def create_task_endpoint(
-    task_create: TaskCreate, session: Session = Depends(get_session)
+    task_create: TaskCreate,
+    vault: str | None = None,
+    writer: TaskWriter = Depends(get_task_writer),
+    registry: ShardRegistry = Depends(get_shards),
 ):
-    return services.create_task(session, task_create)
+    if vault is not None and vault not in registry:
+        raise HTTPException(status_code=404, detail="Vault not found")
+    return writer.create_task(task_create, vault)
 
 
 @app.delete("/tasks/{task_id}", status_code=204)
-def delete_task_endpoint(task_id: int, session: Session = Depends(get_session)) -> None:
-    deleted = services.delete_task(session, task_id)
+def delete_task_endpoint(
+    task_id: int, writer: TaskWriter = Depends(get_task_writer)
+) -> None:
+    deleted = writer.delete_task(task_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Task not found")
     return None
@@ -79,9 +199,9 @@ def delete_task_endpoint(task_id: int, session: Session = Depends(get_session))
 
 @app.patch("/tasks/{task_id}", response_model=TaskPublic)
 def update_task_endpoint(
-    task_id: int, task_update: TaskUpdate, session: Session = Depends(get_session)
+    task_id: int, task_update: TaskUpdate, writer: TaskWriter = Depends(get_task_writer)
 ):
-    updated_task = services.update_task(session, task_id, task_update)
+    updated_task = writer.update_task(task_id, task_update)
     if not updated_task:
         raise HTTPException(status_code=404, detail="Task not found")
     return updated_task
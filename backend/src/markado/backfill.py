@@ -0,0 +1,162 @@
+"""Chunked, resumable backfills for migrations on large tables.
+
+A single ``UPDATE`` over a multi-million-row ``task`` table holds SQLite's
+write lock until it finishes. ``backfill_in_chunks`` instead updates rows in
+id ranges of ``chunk_size``, committing after each range, so API writes wait
+at most one chunk and readers (in WAL mode) are never blocked.
+
+Progress is recorded in the ``backfill_progress`` table in the same
+transaction as each chunk, so an interrupted backfill resumes after the last
+committed range when the migration is run again.
+
+Use it from a migration inside an autocommit block, so that the helper can
+manage its own transactions::
+
+    def upgrade() -> None:
+        with op.batch_alter_table("task") as batch_op:
+            batch_op.add_column(sa.Column("source", sa.String(), nullable=True))
+        with op.get_context().autocommit_block():
+            backfill_in_chunks(
+                op.get_bind(),
+                name="task.source",
+                table="task",
+                update="UPDATE task SET source = 'api' "
+                "WHERE id BETWEEN :start AND :end",
+            )
+"""
+
+import logging
+import os
+import time
+from collections.abc import Callable
+from dataclasses import dataclass
+
+from sqlalchemy import Connection, text
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_CHUNK_SIZE = int(os.getenv("BACKFILL_CHUNK_SIZE", 10_000))
+
+PROGRESS_TABLE_DDL = """
+CREATE TABLE IF NOT EXISTS backfill_progress (
+    name VARCHAR PRIMARY KEY,
+    last_id INTEGER NOT NULL,
+    done BOOLEAN NOT NULL DEFAULT 0
+)
+"""
+
+
+@dataclass
+class BackfillProgress:
+    """Where a backfill has got to, passed to the progress callback."""
+
+    name: str
+    last_id: int
+    max_id: int
+    chunks: int = 0
+    elapsed: float = 0.0
+    # last_id when this run started, so a resumed run's ETA uses its own rate
+    resumed_from: int = 0
+
+    @property
+    def fraction(self) -> float:
+        """Share of the id range done, from 0 to 1."""
+        return min(self.last_id / self.max_id, 1.0) if self.max_id else 1.0
+
+    @property
+    def eta(self) -> float | None:
+        """Estimated seconds left, from the rate so far in this run."""
+        done = self.last_id - self.resumed_from
+        if done <= 0:
+            return None
+        return self.elapsed / done * max(self.max_id - self.last_id, 0)
+
+
+def log_progress(progress: BackfillProgress) -> None:
+    """Default progress callback: one log line per chunk."""
+    eta = f"{progress.eta:.0f}s" if progress.eta is not None else "?"
+    logger.info(
+        f"Backfill {progress.name}: id {progress.last_id}/{progress.max_id} "
+        f"({progress.fraction:.0%}), ETA {eta}"
+    )
+
+
+def backfill_in_chunks(
+    connection: Connection,
+    *,
+    name: str,
+    table: str,
+    update: str,
+    chunk_size: int = BACKFILL_CHUNK_SIZE,
+    pause: float = 0.0,
+    progress: Callable[[BackfillProgress], None] = log_progress,
+) -> BackfillProgress:
+    """Run ``update`` over ``table`` one id range at a time.
+
+    Args:
+        connection: A connection in autocommit mode, for example
+            ``op.get_bind()`` inside ``op.get_context().autocommit_block()``.
+        name: Unique name of this backfill, used to resume it.
+        table: Table whose integer ``id`` column bounds the ranges.
+        update: SQL statement with ``:start`` and ``:end`` parameters
+            (inclusive). It must be safe to run twice over the same range.
+            Rows inserted after the backfill starts are not visited, so the
+            application must already write the new value for them.
+        chunk_size: Number of ids per chunk.
+        pause: Seconds to sleep between chunks, to leave room for other
+            writers.
+        progress: Called after each committed chunk.
+
+    Returns:
+        The final progress of the backfill.
+    """
+    connection.exec_driver_sql(PROGRESS_TABLE_DDL)
+    connection.exec_driver_sql("PRAGMA busy_timeout = 5000")
+    row = connection.execute(
+        text("SELECT last_id, done FROM backfill_progress WHERE name = :name"),
+        {"name": name},
+    ).first()
+    last_id = row.last_id if row else 0
+    max_id = connection.exec_driver_sql(f"SELECT MAX(id) FROM {table}").scalar() or 0
+
+    started = time.monotonic()
+    state = BackfillProgress(name, last_id, max_id, resumed_from=last_id)
+    if row is not None and row.done:
+        logger.info(f"Backfill {name} already complete")
+        return state
+    if last_id:
+        logger.info(f"Resuming backfill {name} after id {last_id}")
+
+    update_statement = text(update)
+    while state.last_id < max_id:
+        start = state.last_id + 1
+        end = min(start + chunk_size - 1, max_id)
+        connection.exec_driver_sql("BEGIN IMMEDIATE")
+        try:
+            connection.execute(update_statement, {"start": start, "end": end})
+            _save_progress(connection, name, end, done=False)
+            connection.exec_driver_sql("COMMIT")
+        except BaseException:
+            connection.exec_driver_sql("ROLLBACK")
+            raise
+        state.last_id = end
+        state.chunks += 1
+        state.elapsed = time.monotonic() - started
+        progress(state)
+        if pause:
+            time.sleep(pause)
+
+    _save_progress(connection, name, state.last_id, done=True)
+    return state
+
+
+def _save_progress(connection: Connection, name: str, last_id: int, done: bool):
+    connection.execute(
+        text(
+            "INSERT INTO backfill_progress (name, last_id, done) "
+            "VALUES (:name, :last_id, :done) "
+            "ON CONFLICT (name) DO UPDATE SET "
+            "last_id = excluded.last_id, done = excluded.done"
+        ),
+        {"name": name, "last_id": last_id, "done": done},
+    )
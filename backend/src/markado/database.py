@@ -3,7 +3,8 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-from sqlmodel import Session, SQLModel, create_engine
+from sqlalchemy import Engine, event
+from sqlmodel import SQLModel, create_engine
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -12,9 +13,40 @@ BASE_DIR = Path(__file__).resolve().parents[2]
 db_path = Path(f"{BASE_DIR}/{os.getenv('DATABASE_PATH', './data')}")
 sqlite_url = f"sqlite:///{db_path}"
 
+# "local" (default): every worker reads and writes the database itself.
+# "ipc": writes go to a single writer process, see markado.writer.
+WRITER_MODE = os.getenv("WRITER_MODE", "local").lower()
+
+
+def make_engine(path: Path, *, read_only: bool = False, echo: bool = False) -> Engine:
+    """Create an engine for the SQLite file at ``path``.
+
+    Read-write engines switch the file to WAL journaling so that readers in
+    other processes are never blocked by the writer. Read-only engines open
+    the file with ``mode=ro`` and cannot take the write lock at all.
+    """
+    connect_args = {"check_same_thread": False}
+    if read_only:
+        url = f"sqlite:///file:{path}?mode=ro&uri=true"
+    else:
+        url = f"sqlite:///{path}"
+    new_engine = create_engine(url, echo=echo, connect_args=connect_args)
+
+    @event.listens_for(new_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA busy_timeout = 5000")
+        if not read_only:
+            cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.close()
+
+    return new_engine
+
+
 # intialise sqlmodel engine
-connect_args = {"check_same_thread": False}
-engine = create_engine(sqlite_url, echo=True, connect_args=connect_args)
+engine = make_engine(db_path, echo=True)
+# read-only engine used for request sessions when writes go through the writer
+read_engine = make_engine(db_path, read_only=True, echo=True)
 
 
 def init_db() -> None:
@@ -32,12 +64,3 @@ def init_db() -> None:
 def create_db_and_tables() -> None:
     logger.info(f"Creating database tables at {sqlite_url}")
     SQLModel.metadata.create_all(engine)
-
-
-def get_session():
-    # Dependency that opens a new DB session for each request.
-    # Uses 'yield' so FastAPI can pause here, run the endpoint with the open session,
-    # then resume afterwards to exit the with block and close the session.
-    # Using 'return' would close too early.
-    with Session(engine) as session:
-        yield session
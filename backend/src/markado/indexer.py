@@ -0,0 +1,133 @@
+"""Index parsed markdown files into a shard's task tables.
+
+Each file's tasks are replaced as a whole: the rows found at that
+``file_path`` on the last run are deleted and the file's current tasks
+inserted, with their tags linked through ``task_tag``. Tasks created through
+the API have no ``file_path`` and are never touched.
+"""
+
+import logging
+from collections.abc import Callable, Iterable
+from datetime import date
+from pathlib import Path
+
+from sqlalchemy import delete
+from sqlmodel import Session, col, select
+
+from markado import agenda, tags
+from markado.models import Project, Task, TaskTag
+from markado.parse_cache import ParseCache
+from markado.parser import ParsedFile, parse_vault
+
+logger = logging.getLogger(__name__)
+
+
+def _as_list(value: str | list[str] | None) -> list[str]:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return value.replace(",", " ").split()
+    return value
+
+
+def _due(value: str | None) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def get_or_create_project(session: Session, name: str) -> Project:
+    """Return the project called ``name``, creating it if needed."""
+    project = session.exec(select(Project).where(col(Project.name) == name)).first()
+    if project is None:
+        project = Project(name=name)
+        session.add(project)
+    return project
+
+
+def remove_file(session: Session, file_path: str) -> None:
+    """Delete the tasks indexed from ``file_path`` (not committed)."""
+    task_ids = select(Task.id).where(col(Task.file_path) == file_path)
+    session.exec(delete(TaskTag).where(col(TaskTag.task_id).in_(task_ids)))  # type: ignore[call-overload]
+    session.exec(delete(Task).where(col(Task.file_path) == file_path))  # type: ignore[call-overload]
+
+
+def index_file(session: Session, file_path: str, parsed: ParsedFile) -> int:
+    """Replace the tasks of one file (not committed); returns how many."""
+    remove_file(session, file_path)
+    frontmatter = parsed.frontmatter
+    project_name = frontmatter.get("project")
+    project = (
+        get_or_create_project(session, project_name)
+        if isinstance(project_name, str) and project_name
+        else None
+    )
+    file_tags = _as_list(frontmatter.get("tags"))
+    for parsed_task in parsed.tasks:
+        task = Task(
+            name=parsed_task.name,
+            complete=parsed_task.complete,
+            priority=parsed_task.priority,
+            due=_due(parsed_task.due),
+            file_path=file_path,
+            line_number=parsed_task.line_number,
+            project=project,
+        )
+        session.add(task)
+        tags.set_task_tags(session, task, [*file_tags, *parsed_task.tags])
+    return len(parsed.tasks)
+
+
+def indexed_files(session: Session) -> set[str]:
+    """Every file_path that has tasks in the index."""
+    statement = select(Task.file_path).where(col(Task.file_path).is_not(None))
+    return {path for path in session.exec(statement.distinct()).all() if path}
+
+
+def index_files(
+    session: Session,
+    files: Iterable[tuple[Path, ParsedFile]],
+    shard_name: str,
+    on_written: Callable[[str, int], None] | None = None,
+) -> int:
+    """Index ``files`` and drop files no longer present; returns task count.
+
+    Commits after each file, so readers see progress and the write lock is
+    only held for one file at a time; ``on_written`` is then called with the
+    file's path and task count. If ``files`` raises, the files indexed so far
+    stay committed and nothing is dropped.
+    """
+    stale = indexed_files(session)
+    count = 0
+    try:
+        for rel_path, parsed in files:
+            file_path = rel_path.as_posix()
+            stale.discard(file_path)
+            written = index_file(session, file_path, parsed)
+            session.commit()
+            count += written
+            if on_written is not None:
+                on_written(file_path, written)
+        for file_path in stale:
+            remove_file(session, file_path)
+        session.commit()
+    finally:
+        # Rows were replaced under any cached agenda buckets and bitmaps.
+        agenda.cache.invalidate(shard_name)
+        tags.bitmaps.invalidate(shard_name)
+    return count
+
+
+def index_vault(
+    session: Session,
+    vault_dir: Path,
+    shard_name: str,
+    cache: ParseCache | None = None,
+) -> int:
+    """Parse and index every markdown file under ``vault_dir``."""
+    count = index_files(session, parse_vault(vault_dir, cache), shard_name)
+    logger.info(f"Indexed {count} tasks from {vault_dir}")
+    return count
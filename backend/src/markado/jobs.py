@@ -0,0 +1,367 @@
+"""Background jobs, starting with the vault resync.
+
+A resync re-reads every markdown file of a vault and rewrites its index,
+which takes minutes on a large vault. ``POST /resync`` therefore only queues
+a ``Job`` on the process-wide ``JobRunner`` and returns its id; the job runs
+on the runner's single thread while ``GET /jobs/{id}`` reports its progress.
+A resync requested while an equivalent one is queued or running is merged
+into it rather than queued again.
+
+The resync thread runs under a ``Throttle`` so that it doesn't starve API
+requests: it sleeps between files to stay under ``RESYNC_CPU_FRACTION`` of
+one core (and of the GIL it shares with request handlers), caps file reads
+at ``RESYNC_MAX_BYTES_PER_SEC`` and, on Linux, lowers its own scheduling
+priority by ``RESYNC_NICE``. Each file is committed separately, so API
+writes wait for at most one file.
+
+In "ipc" mode jobs run in the writer process, which owns the write
+connections; workers reach the runner through the writer (see
+``markado.writer``).
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from collections.abc import Callable, Iterator
+from dataclasses import dataclass, field
+from datetime import UTC, datetime
+from pathlib import Path
+
+from markado import indexer
+from markado.models import JobPublic
+from markado.parse_cache import ParseCache, default_parse_cache
+from markado.parser import ParsedFile, parse_content, vault_files
+from markado.shards import Shard, ShardRegistry
+
+logger = logging.getLogger(__name__)
+
+RESYNC_CPU_FRACTION = float(os.getenv("RESYNC_CPU_FRACTION", 0.5))
+RESYNC_MAX_BYTES_PER_SEC = int(os.getenv("RESYNC_MAX_BYTES_PER_SEC", 16 * 1024**2))
+RESYNC_NICE = int(os.getenv("RESYNC_NICE", 10))
+# Finished jobs kept for GET /jobs/{id}; older ones are forgotten.
+MAX_FINISHED_JOBS = 100
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+ACTIVE = (QUEUED, RUNNING)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job when it has been asked to stop."""
+
+
+def _now() -> datetime:
+    return datetime.now(UTC)
+
+
+@dataclass
+class Job:
+    """A unit of background work and its progress counters."""
+
+    kind: str
+    vault: str | None = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = QUEUED
+    created_at: datetime = field(default_factory=_now)
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    files_total: int | None = None
+    files_scanned: int = 0
+    files_parsed: int = 0
+    files_written: int = 0
+    tasks_written: int = 0
+    error: str | None = None
+    _started: float | None = field(default=None, repr=False)
+    _finished: float | None = field(default=None, repr=False)
+    _cancel: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def cancel_requested(self) -> bool:
+        """Whether ``cancel`` has been called on this job."""
+        return self._cancel.is_set()
+
+    def covers(self, kind: str, vault: str | None) -> bool:
+        """Whether this job, if still active, does the work requested."""
+        return (
+            self.status in ACTIVE
+            and not self.cancel_requested
+            and self.kind == kind
+            and self.vault in (None, vault)
+        )
+
+    def check_cancelled(self) -> None:
+        """Raise JobCancelled if ``cancel`` has been called."""
+        if self.cancel_requested:
+            raise JobCancelled
+
+    def wait(self, seconds: float) -> None:
+        """Sleep for ``seconds``, waking early (and raising) on cancellation."""
+        if seconds > 0 and self._cancel.wait(seconds):
+            raise JobCancelled
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds spent running so far."""
+        if self._started is None:
+            return 0.0
+        return (self._finished or time.monotonic()) - self._started
+
+    @property
+    def files_per_second(self) -> float | None:
+        """Files written per second of running time."""
+        if not self.files_written or not self.elapsed:
+            return None
+        return self.files_written / self.elapsed
+
+    @property
+    def eta_seconds(self) -> float | None:
+        """Estimated seconds left, from the throughput so far."""
+        rate = self.files_per_second
+        if self.status != RUNNING or self.files_total is None or not rate:
+            return None
+        return max(self.files_total - self.files_written, 0) / rate
+
+    def public(self) -> JobPublic:
+        """Snapshot of the job for the API."""
+        return JobPublic(
+            id=self.id,
+            kind=self.kind,
+            vault=self.vault,
+            status=self.status,
+            created_at=self.created_at,
+            started_at=self.started_at,
+            finished_at=self.finished_at,
+            files_total=self.files_total,
+            files_scanned=self.files_scanned,
+            files_parsed=self.files_parsed,
+            files_written=self.files_written,
+            tasks_written=self.tasks_written,
+            files_per_second=self.files_per_second,
+            eta_seconds=self.eta_seconds,
+            error=self.error,
+        )
+
+
+Work = Callable[[Job], None]
+
+
+class JobRunner:
+    """Runs queued jobs one at a time on a background thread."""
+
+    def __init__(self, max_finished: int = MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._jobs: OrderedDict[str, Job] = OrderedDict()
+        self._queue: queue.Queue[tuple[Job, Work] | None] = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the worker thread (once)."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="job-runner", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Cancel every active job and wait for the worker thread to exit."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            for job in [job for job in self._jobs.values() if job.status in ACTIVE]:
+                job._cancel.set()
+                if job.status == QUEUED:
+                    self._finish(job, CANCELLED)
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout)
+
+    def submit(self, kind: str, vault: str | None, work: Work) -> Job:
+        """Queue ``work``, or return the active job already doing it."""
+        with self._lock:
+            for job in self._jobs.values():
+                if job.covers(kind, vault):
+                    return job
+            job = Job(kind, vault)
+            self._jobs[job.id] = job
+            self._prune()
+        self._queue.put((job, work))
+        return job
+
+    def get(self, job_id: str) -> Job | None:
+        """Look up a job by id."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Job | None:
+        """Ask a job to stop; a queued job is cancelled at once."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.status not in ACTIVE:
+                return job
+            job._cancel.set()
+            if job.status == QUEUED:
+                self._finish(job, CANCELLED)
+            return job
+
+    def _run(self) -> None:
+        if RESYNC_NICE and hasattr(os, "setpriority"):
+            try:
+                # On Linux the nice value is per thread, so this only slows
+                # down background jobs, not request handlers.
+                os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), RESYNC_NICE)
+            except OSError:
+                pass
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            job, work = item
+            with self._lock:
+                if job.status != QUEUED:
+                    continue
+                job.status = RUNNING
+                job.started_at = _now()
+                job._started = time.monotonic()
+            logger.info(f"Job {job.id} ({job.kind}) started")
+            try:
+                work(job)
+                status = CANCELLED if job.cancel_requested else SUCCEEDED
+            except JobCancelled:
+                status = CANCELLED
+            except Exception as e:
+                logger.exception(f"Job {job.id} ({job.kind}) failed")
+                job.error = f"{type(e).__name__}: {e}"
+                status = FAILED
+            with self._lock:
+                self._finish(job, status)
+            logger.info(f"Job {job.id} ({job.kind}) {status}")
+
+    def _finish(self, job: Job, status: str) -> None:
+        job.status = status
+        job.finished_at = _now()
+        if job._started is not None:
+            job._finished = time.monotonic()
+        self._prune()
+
+    def _prune(self) -> None:
+        finished = [job.id for job in self._jobs.values() if job.status not in ACTIVE]
+        for job_id in finished[: max(len(finished) - self.max_finished, 0)]:
+            del self._jobs[job_id]
+
+
+class Throttle:
+    """Keeps a background job under a CPU share and a read bandwidth."""
+
+    def __init__(
+        self,
+        cpu_fraction: float = RESYNC_CPU_FRACTION,
+        bytes_per_second: int = RESYNC_MAX_BYTES_PER_SEC,
+    ):
+        self.cpu_fraction = cpu_fraction
+        self.bytes_per_second = bytes_per_second
+        self._started = time.monotonic()
+        self._bytes = 0
+
+    def after_read(self, job: Job, nbytes: int) -> None:
+        """Sleep until reading ``nbytes`` more fits the bandwidth cap."""
+        if self.bytes_per_second <= 0:
+            return
+        self._bytes += nbytes
+        ahead = self._bytes / self.bytes_per_second - (time.monotonic() - self._started)
+        job.wait(ahead)
+
+    def after_work(self, job: Job, busy: float) -> None:
+        """Sleep long enough that ``busy`` seconds stay within the CPU share."""
+        if 0 < self.cpu_fraction < 1:
+            job.wait(busy * (1 / self.cpu_fraction - 1))
+
+
+def _read_and_parse(
+    job: Job,
+    vault_dir: Path,
+    paths: list[Path],
+    cache: ParseCache | None,
+    throttle: Throttle,
+) -> Iterator[tuple[Path, ParsedFile]]:
+    for path in paths:
+        job.check_cancelled()
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            # Deleted since the scan; the indexer drops its old tasks.
+            continue
+        throttle.after_read(job, len(content))
+        started = time.monotonic()
+        parsed = parse_content(content, cache)
+        job.files_parsed += 1
+        # The indexer writes this file before asking for the next one, so
+        # the pause below also covers the write.
+        yield path.relative_to(vault_dir), parsed
+        throttle.after_work(job, time.monotonic() - started)
+
+
+def resync(
+    job: Job,
+    shards: list[Shard],
+    cache: ParseCache | None = None,
+    throttle: Throttle | None = None,
+) -> None:
+    """Rebuild the index of each shard's vault from its markdown files."""
+    throttle = throttle or Throttle()
+    scanned: list[tuple[Shard, Path, list[Path]]] = []
+    for shard in shards:
+        if shard.vault_dir is None:
+            continue
+        job.check_cancelled()
+        paths = vault_files(shard.vault_dir)
+        job.files_scanned += len(paths)
+        scanned.append((shard, shard.vault_dir, paths))
+    if not scanned:
+        raise ValueError("No vault directory to resync (see VAULT_DIRS)")
+    job.files_total = job.files_scanned
+
+    def on_written(file_path: str, tasks: int) -> None:
+        job.files_written += 1
+        job.tasks_written += tasks
+
+    for shard, vault_dir, paths in scanned:
+        files = _read_and_parse(job, vault_dir, paths, cache, throttle)
+        with shard.session() as session:
+            indexer.index_files(session, files, shard.name, on_written)
+        logger.info(f"Resynced {len(paths)} files of vault {shard.name}")
+
+
+runner = JobRunner()
+_parse_cache: ParseCache | None = None
+
+
+def start_resync(registry: ShardRegistry, vault: str | None = None) -> Job:
+    """Queue a resync of one vault (all if None), merging with an active one.
+
+    Raises KeyError for an unknown vault.
+    """
+    global _parse_cache
+    shards = [registry.get(vault)] if vault else list(registry)
+    if _parse_cache is None:
+        _parse_cache = default_parse_cache()
+    cache = _parse_cache
+    return runner.submit("resync", vault, lambda job: resync(job, shards, cache))
+
+
+def start_jobs() -> None:
+    """Start the process-wide job runner (called from the app lifespan)."""
+    runner.start()
+
+
+def stop_jobs() -> None:
+    """Cancel running jobs and stop the runner."""
+    runner.stop()
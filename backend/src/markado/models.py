@@ -1,4 +1,6 @@
-from sqlmodel import Field, Relationship, SQLModel
+from datetime import date, datetime
+
+from sqlmodel import Field, Index, Relationship, SQLModel
 
 # PROJECT CLASSES
 
@@ -21,6 +23,24 @@ class ProjectPublic(ProjectBase):
     tasks: list["Task"]
 
 
+# TAG CLASSES
+
+
+class TaskTag(SQLModel, table=True):
+    __tablename__ = "task_tag"
+    # The primary key serves task -> tags; this index serves tag -> tasks.
+    __table_args__ = (Index("ix_task_tag_tag_id_task_id", "tag_id", "task_id"),)
+
+    task_id: int | None = Field(default=None, foreign_key="task.id", primary_key=True)
+    tag_id: int | None = Field(default=None, foreign_key="tag.id", primary_key=True)
+
+
+class Tag(SQLModel, table=True):
+    id: int | None = Field(default=None, primary_key=True)
+    name: str = Field(index=True, unique=True)
+    tasks: list["Task"] = Relationship(back_populates="tags", link_model=TaskTag)
+
+
 # TASK CLASSES
 
 
@@ -29,26 +49,75 @@ class TaskBase(SQLModel):
     priority: int | None = Field(default=None)
     # context: str | None = Field(default=None)
     complete: bool = Field(default=False)
+    due: date | None = Field(default=None)
     project_id: int | None = Field(default=None, foreign_key="project.id")
 
 
 class Task(TaskBase, table=True):
+    # Serves the agenda: open tasks in a due-date range, in due order.
+    __table_args__ = (Index("ix_task_complete_due", "complete", "due"),)
+
     id: int | None = Field(default=None, primary_key=True)
+    # Where the indexer found the task; None for tasks created through the API.
+    file_path: str | None = Field(default=None, index=True)
+    line_number: int | None = Field(default=None)
     project: Project | None = Relationship(back_populates="tasks")
+    tags: list[Tag] = Relationship(back_populates="tasks", link_model=TaskTag)
 
 
 class TaskCreate(TaskBase):
-    pass
+    tags: list[str] = []
 
 
 class TaskUpdate(SQLModel):
     name: str | None = None
     priority: int | None = None
     complete: bool = False
+    due: date | None = None
+    tags: list[str] | None = None
 
 
 class TaskPublic(TaskBase):
     id: int
+    file_path: str | None = None
+    line_number: int | None = None
+    tags: list[str] = []
+
+
+class TaskStats(SQLModel):
+    total: int = 0
+    complete: int = 0
+
+
+class AgendaDay(SQLModel):
+    day: date
+    tasks: list[TaskPublic]
+
+
+class QueryExplain(SQLModel):
+    query: str
+    sql: str
+    plan: list[str]
+    full_scan: bool
+    rejected: bool
+
+
+class JobPublic(SQLModel):
+    id: str
+    kind: str
+    vault: str | None = None
+    status: str
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+    files_total: int | None = None
+    files_scanned: int = 0
+    files_parsed: int = 0
+    files_written: int = 0
+    tasks_written: int = 0
+    files_per_second: float | None = None
+    eta_seconds: float | None = None
+    error: str | None = None
 
 
 # USER CLASSES
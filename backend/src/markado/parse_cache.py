@@ -0,0 +1,204 @@
+"""On-disk cache of parsed markdown files.
+
+Entries are keyed by the SHA-256 of the file content and stored under a
+directory named after a hash of the parser's source, so a parser change
+invalidates the whole cache without any bookkeeping. Rebuilding the index of
+an unchanged vault then only reads files to hash them and loads their parse
+results from here.
+
+Each entry is a small header followed by a zlib-compressed ``marshal`` dump of
+plain tuples. The total size is bounded by ``max_bytes``; when it is exceeded
+the least recently used entries are evicted.
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import re
+import shutil
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+from markado import parser
+from markado.database import db_path
+from markado.parser import ParsedFile, ParsedTask, parse_markdown
+
+logger = logging.getLogger(__name__)
+
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", f"{db_path}.parse-cache")
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+
+MAGIC = b"MKPC"
+# Bump when the on-disk entry layout changes (independent of the parser).
+CACHE_FORMAT = 2
+HEADER = struct.Struct("<4sH8s")
+MARSHAL_VERSION = 4
+# After eviction the cache is trimmed to this fraction of max_bytes, so a
+# steady stream of misses doesn't trigger an eviction pass on every put.
+EVICT_TO = 0.9
+# Names of version directories, including the "v<n>-f<n>" ones from when the
+# parser version was a number; anything else under the cache root is left
+# alone, since PARSE_CACHE_DIR may point at a shared directory.
+VERSION_DIR = re.compile(r"v(\d+-f\d+|[0-9a-f]{16})")
+
+
+def parser_key(source: Path = Path(parser.__file__)) -> bytes:
+    """Fingerprint the parser source and the entry format, to key the cache."""
+    digest = hashlib.sha256(source.read_bytes())
+    digest.update(CACHE_FORMAT.to_bytes(2, "little"))
+    return digest.digest()[:8]
+
+
+PARSER_KEY = parser_key()
+
+
+class ParseCache:
+    """Content-addressed cache of ``ParsedFile`` results."""
+
+    def __init__(self, cache_dir: Path | str, max_bytes: int = PARSE_CACHE_MAX_BYTES):
+        self.root = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.version_dir = self.root / f"v{PARSER_KEY.hex()}"
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.version_dir.mkdir(parents=True, exist_ok=True)
+        self._drop_stale_versions()
+        self.size = sum(p.stat().st_size for p in self._entries())
+
+    def parse(self, content: bytes) -> ParsedFile:
+        """Return the parse of ``content``, from the cache if possible."""
+        digest = hashlib.sha256(content).hexdigest()
+        parsed = self.get(digest)
+        if parsed is None:
+            parsed = parse_markdown(content.decode("utf-8", errors="replace"))
+            self.put(digest, parsed)
+        return parsed
+
+    def get(self, digest: str) -> ParsedFile | None:
+        """Load the entry for ``digest``; returns None on a miss."""
+        path = self._path(digest)
+        try:
+            data = path.read_bytes()
+            parsed = decode(data)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, EOFError, TypeError, zlib.error):
+            logger.warning(f"Discarding corrupt parse cache entry {path}")
+            self._remove(path)
+            self.misses += 1
+            return None
+        # Record the access for LRU eviction.
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            # Evicted by another process or thread since the read.
+            self.misses += 1
+            return None
+        self.hits += 1
+        return parsed
+
+    def put(self, digest: str, parsed: ParsedFile) -> None:
+        """Store ``parsed`` under ``digest`` and evict if over the size limit."""
+        data = encode(parsed)
+        path = self._path(digest)
+        if len(data) > self.max_bytes or path.exists():
+            return
+        path.parent.mkdir(exist_ok=True)
+        # Write then rename, so concurrent readers never see a partial entry.
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.size += len(data)
+        if self.size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove least recently used entries until under the size limit."""
+        with self._lock:
+            entries = []
+            for path in self._entries():
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            entries.sort()
+            size = sum(entry[1] for entry in entries)
+            target = self.max_bytes * EVICT_TO
+            for _, entry_size, path in entries:
+                if size <= target:
+                    break
+                self._remove(path)
+                size -= entry_size
+            self.size = size
+
+    def clear(self) -> None:
+        """Remove every entry."""
+        with self._lock:
+            shutil.rmtree(self.version_dir, ignore_errors=True)
+            self.version_dir.mkdir(parents=True, exist_ok=True)
+            self.size = 0
+
+    def _path(self, digest: str) -> Path:
+        return self.version_dir / digest[:2] / f"{digest}.bin"
+
+    def _entries(self):
+        return self.version_dir.glob("*/*.bin")
+
+    def _remove(self, path: Path) -> None:
+        path.unlink(missing_ok=True)
+
+    def _drop_stale_versions(self) -> None:
+        for child in self.root.iterdir():
+            if (
+                child.is_dir()
+                and child != self.version_dir
+                and VERSION_DIR.fullmatch(child.name)
+            ):
+                logger.info(f"Removing stale parse cache {child}")
+                shutil.rmtree(child, ignore_errors=True)
+
+
+def encode(parsed: ParsedFile) -> bytes:
+    """Serialise a ``ParsedFile`` into the cache entry format."""
+    tasks = tuple(
+        (t.line_number, t.name, t.complete, t.due, t.priority, tuple(t.tags))
+        for t in parsed.tasks
+    )
+    frontmatter = tuple(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in parsed.frontmatter.items()
+    )
+    body = zlib.compress(marshal.dumps((frontmatter, tasks), MARSHAL_VERSION))
+    return HEADER.pack(MAGIC, CACHE_FORMAT, PARSER_KEY) + body
+
+
+def decode(data: bytes) -> ParsedFile:
+    """Deserialise a cache entry; raises ValueError if it is not valid."""
+    if len(data) < HEADER.size:
+        raise ValueError("Truncated parse cache entry")
+    magic, cache_format, parser_key = HEADER.unpack_from(data)
+    if (magic, cache_format, parser_key) != (MAGIC, CACHE_FORMAT, PARSER_KEY):
+        raise ValueError("Parse cache entry from another format or parser version")
+    frontmatter, tasks = marshal.loads(zlib.decompress(data[HEADER.size :]))
+    return ParsedFile(
+        frontmatter={
+            key: list(value) if isinstance(value, tuple) else value
+            for key, value in frontmatter
+        },
+        tasks=[
+            ParsedTask(line, name, complete, due, priority, list(tags))
+            for line, name, complete, due, priority, tags in tasks
+        ],
+    )
+
+
+def default_parse_cache() -> ParseCache:
+    """Build the cache configured by ``PARSE_CACHE_DIR``/``_MAX_BYTES``."""
+    return ParseCache(PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES)
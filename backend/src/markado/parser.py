@@ -0,0 +1,166 @@
+"""Markdown task parser for the v0.2 markdown-first engine.
+
+Parses a markdown file into its YAML frontmatter and the tasks it contains.
+Supported task syntax is the Obsidian Tasks style (``- [ ] text`` with emoji
+metadata and ``#tags``) plus Dataview inline fields (``key:: value``).
+
+The on-disk parse cache is keyed by a hash of this file, so any edit here
+drops old entries. Keep the parsing rules in this module for that to hold.
+"""
+
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from markado.parse_cache import ParseCache
+
+TASK_RE = re.compile(r"^\s*[-*+] \[(?P<status>.)\] (?P<text>.*)$")
+TAG_RE = re.compile(r"(?<!\S)#(?P<tag>[\w/-]+)")
+# [key:: value] or (key:: value) anywhere, or a bare key:: value up to the end
+INLINE_FIELD_RE = re.compile(
+    r"[\[(](?P<bkey>[\w-]+)::\s*(?P<bvalue>[^\])]*)[\])]"
+    r"|(?<!\S)(?P<key>[\w-]+)::\s*(?P<value>.*)$"
+)
+DUE_EMOJI_RE = re.compile(r"📅\s*(?P<due>\d{4}-\d{2}-\d{2})")
+# Obsidian Tasks priority emojis, mapped onto Task.priority (1 = highest)
+PRIORITY_EMOJIS = {"🔺": 1, "⏫": 2, "🔼": 3, "🔽": 4, "⏬": 5}
+# ASCII digits only (str.isdigit also accepts "²", which int() rejects), and
+# no more than a SQLite INTEGER column holds.
+PRIORITY_RE = re.compile(r"[0-9]{1,18}")
+
+Frontmatter = dict[str, str | list[str]]
+
+
+@dataclass(slots=True)
+class ParsedTask:
+    """A task line as found in a markdown file."""
+
+    line_number: int
+    name: str
+    complete: bool = False
+    due: str | None = None
+    priority: int | None = None
+    tags: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class ParsedFile:
+    """Everything the indexer needs from one markdown file."""
+
+    frontmatter: Frontmatter = field(default_factory=dict)
+    tasks: list[ParsedTask] = field(default_factory=list)
+
+
+def parse_frontmatter(lines: list[str]) -> tuple[Frontmatter, int]:
+    """Parse a leading ``---`` block; returns it and the first body line index.
+
+    Only the flat subset of YAML used for note metadata is supported:
+    ``key: value``, ``key: [a, b]`` and ``key:`` followed by ``- item`` lines.
+    """
+    if not lines or lines[0].strip() != "---":
+        return {}, 0
+    frontmatter: Frontmatter = {}
+    current_list: list[str] | None = None
+    for index, line in enumerate(lines[1:], start=1):
+        stripped = line.strip()
+        if stripped == "---":
+            return frontmatter, index + 1
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") and current_list is not None:
+            current_list.append(_unquote(stripped[2:]))
+            continue
+        key, sep, value = stripped.partition(":")
+        if not sep:
+            continue
+        key, value = key.strip(), value.strip()
+        if not value:
+            current_list = []
+            frontmatter[key] = current_list
+        elif value.startswith("[") and value.endswith("]"):
+            current_list = None
+            items = [_unquote(item) for item in value[1:-1].split(",")]
+            frontmatter[key] = [item for item in items if item]
+        else:
+            current_list = None
+            frontmatter[key] = _unquote(value)
+    # No closing fence: treat the whole file as body, like Obsidian does.
+    return {}, 0
+
+
+def parse_task_line(line: str, line_number: int) -> ParsedTask | None:
+    """Parse a single line; returns None if it is not a task."""
+    match = TASK_RE.match(line)
+    if match is None:
+        return None
+    text = match["text"]
+    task = ParsedTask(line_number=line_number, name="")
+    task.complete = match["status"] in ("x", "X")
+
+    for field_match in INLINE_FIELD_RE.finditer(text):
+        key = (field_match["bkey"] or field_match["key"]).lower()
+        value = (field_match["bvalue"] or field_match["value"] or "").strip()
+        if key == "due":
+            task.due = value or None
+        elif key == "priority":
+            if PRIORITY_RE.fullmatch(value):
+                task.priority = int(value)
+    text = INLINE_FIELD_RE.sub("", text)
+
+    due_match = DUE_EMOJI_RE.search(text)
+    if due_match is not None:
+        task.due = task.due or due_match["due"]
+        text = DUE_EMOJI_RE.sub("", text)
+    for emoji, priority in PRIORITY_EMOJIS.items():
+        if emoji in text:
+            task.priority = task.priority or priority
+            text = text.replace(emoji, "")
+
+    task.tags = [tag_match["tag"] for tag_match in TAG_RE.finditer(text)]
+    task.name = " ".join(TAG_RE.sub("", text).split())
+    return task
+
+
+def parse_markdown(text: str) -> ParsedFile:
+    """Parse the text of a markdown file."""
+    lines = text.splitlines()
+    frontmatter, body_start = parse_frontmatter(lines)
+    tasks = []
+    for index in range(body_start, len(lines)):
+        task = parse_task_line(lines[index], index + 1)
+        if task is not None:
+            tasks.append(task)
+    return ParsedFile(frontmatter=frontmatter, tasks=tasks)
+
+
+def vault_files(vault_dir: Path) -> list[Path]:
+    """Every markdown file under ``vault_dir``, in path order."""
+    return [path for path in sorted(vault_dir.rglob("*.md")) if path.is_file()]
+
+
+def parse_content(content: bytes, cache: "ParseCache | None" = None) -> ParsedFile:
+    """Parse the raw bytes of a markdown file, through ``cache`` if given."""
+    if cache is not None:
+        return cache.parse(content)
+    return parse_markdown(content.decode("utf-8", errors="replace"))
+
+
+def parse_vault(
+    vault_dir: Path, cache: "ParseCache | None" = None
+) -> Iterator[tuple[Path, ParsedFile]]:
+    """Parse every markdown file under ``vault_dir``, in path order.
+
+    With a cache, unchanged files are served from it instead of being parsed.
+    """
+    for path in vault_files(vault_dir):
+        yield path.relative_to(vault_dir), parse_content(path.read_bytes(), cache)
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
@@ -0,0 +1,474 @@
+"""A small Dataview-style task query language, compiled to indexed SQL.
+
+A query has an optional ``WHERE`` filter, ``SORT`` keys and ``LIMIT``::
+
+    WHERE !complete AND due < today AND (#work OR project = "Launch")
+    SORT due, priority DESC
+    LIMIT 20
+
+Filters compare the task fields ``complete``, ``priority``, ``project``,
+``due`` and ``tags`` with ``= != < <= > >=`` against numbers, ``"strings"``,
+``YYYY-MM-DD`` dates, ``today``, ``true``/``false`` and ``null``; ``#tag`` is
+short for ``tags = "tag"``. Conditions combine with ``AND``, ``OR``, ``NOT``
+(or ``!``) and parentheses. Keywords are case-insensitive.
+
+Compiling yields a parameterised SQLAlchemy statement shaped to use the
+existing indexes: ``!complete`` and ``due`` ranges hit ``ix_task_complete_due``
+and tags go through the ``task_tag`` primary key. Compiled plans are cached by
+normalised query text, so the same query with different spacing or keyword
+case is parsed once. A query without a ``LIMIT`` is rejected when SQLite would
+answer it with a full table scan.
+"""
+
+import os
+import re
+import threading
+from collections import OrderedDict
+from collections.abc import Callable
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Any
+
+from sqlalchemy import (
+    ColumnElement,
+    Date,
+    Select,
+    and_,
+    bindparam,
+    false,
+    not_,
+    or_,
+    true,
+)
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, col, select
+
+from markado.models import Project, QueryExplain, Tag, Task, TaskPublic, TaskTag
+from markado.shards import Shard, ShardRegistry, fan_out
+from markado.tags import normalize_tag
+
+QUERY_PLAN_CACHE_SIZE = int(os.getenv("QUERY_PLAN_CACHE_SIZE", 256))
+MAX_QUERY_LIMIT = 1000
+# Largest value of a SQLite INTEGER (numbers in queries are never negative).
+MAX_INTEGER = 2**63 - 1
+
+KEYWORDS = {
+    "WHERE",
+    "SORT",
+    "LIMIT",
+    "AND",
+    "OR",
+    "NOT",
+    "ASC",
+    "DESC",
+    "TRUE",
+    "FALSE",
+    "NULL",
+    "TODAY",
+}
+FIELDS = {"complete", "priority", "project", "due", "tags"}
+SORT_FIELDS = {"complete", "priority", "project", "due"}
+COMPARISONS = {"=", "!=", "<", "<=", ">", ">="}
+
+TOKEN_RE = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*")
+      | (?P<date>\d{4}-\d{2}-\d{2})
+      | (?P<number>\d+)
+      | (?P<tag>\#[\w/-]+)
+      | (?P<op><=|>=|!=|=|<|>|!|\(|\)|,)
+      | (?P<word>[A-Za-z_]+)
+    )""",
+    re.VERBOSE,
+)
+
+
+class QueryError(ValueError):
+    """Raised for a query that is malformed or would be too expensive."""
+
+
+@dataclass(frozen=True)
+class Token:
+    kind: str
+    value: str
+
+
+@dataclass
+class QueryPlan:
+    """A compiled query, shared by every request with the same normalised text."""
+
+    text: str
+    statement: Select
+    limit: int | None
+    # (field, descending) for each SORT key, in order
+    sort: list[tuple[str, bool]]
+    # EXPLAIN QUERY PLAN rows, filled in on first use
+    steps: list[str] | None = field(default=None, compare=False)
+
+    @property
+    def full_scan(self) -> bool:
+        """Whether SQLite reads a whole table or index to answer the query."""
+        return any(step.startswith("SCAN") for step in self.steps or [])
+
+
+def tokenize(text: str) -> list[Token]:
+    """Split query text into tokens; words are upper-cased if keywords."""
+    tokens = []
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = TOKEN_RE.match(text, position)
+        if match is None:
+            snippet = text[position:].strip()[:20]
+            raise QueryError(f"Unexpected {snippet!r} at position {position}")
+        kind = match.lastgroup
+        assert kind is not None
+        value = match[kind]
+        if kind == "word" and value.upper() in KEYWORDS:
+            kind, value = "keyword", value.upper()
+        elif kind == "word":
+            value = value.lower()
+        elif kind == "tag":
+            value = "#" + normalize_tag(value)
+        tokens.append(Token(kind, value))
+        position = match.end()
+    return tokens
+
+
+def normalize(tokens: list[Token]) -> str:
+    """Canonical text of a query: one space between tokens."""
+    return " ".join(token.value for token in tokens)
+
+
+class _Parser:
+    """Recursive-descent parser building SQL clauses as it goes."""
+
+    def __init__(self, tokens: list[Token]):
+        self.tokens = tokens
+        self.position = 0
+        # Fields the filter mentions anywhere.
+        self.fields: set[str] = set()
+
+    def peek(self) -> Token | None:
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return None
+
+    def accept(self, kind: str, value: str | None = None) -> Token | None:
+        token = self.peek()
+        if token and token.kind == kind and (value is None or token.value == value):
+            self.position += 1
+            return token
+        return None
+
+    def expect(self, kind: str, value: str | None = None) -> Token:
+        token = self.accept(kind, value)
+        if token is None:
+            found = self.peek()
+            wanted = value or {"word": "a field", "number": "a number"}[kind]
+            got = repr(found.value) if found else "end of query"
+            raise QueryError(f"Expected {wanted}, found {got}")
+        return token
+
+    def query(self) -> tuple[ColumnElement[bool], list[tuple[str, bool]], int | None]:
+        where: ColumnElement[bool] = true()
+        sort: list[tuple[str, bool]] = []
+        limit = None
+        if self.accept("keyword", "WHERE"):
+            where = self.expression()
+            if "due" in self.fields and "complete" not in self.fields:
+                # complete is never null, so this changes no results, but it
+                # lets SQLite probe ix_task_complete_due once per value
+                # instead of scanning the table for a due range.
+                where = and_(col(Task.complete).in_([False, True]), where)
+        if self.accept("keyword", "SORT"):
+            sort.append(self.sort_key())
+            while self.accept("op", ","):
+                sort.append(self.sort_key())
+        if self.accept("keyword", "LIMIT"):
+            limit = int(self.expect("number").value)
+            if not 0 < limit <= MAX_QUERY_LIMIT:
+                raise QueryError(f"LIMIT must be between 1 and {MAX_QUERY_LIMIT}")
+        token = self.peek()
+        if token is not None:
+            raise QueryError(f"Unexpected {token.value!r}")
+        return where, sort, limit
+
+    def sort_key(self) -> tuple[str, bool]:
+        name = self.expect("word").value
+        if name not in SORT_FIELDS:
+            raise QueryError(f"Cannot sort by {name!r}")
+        if self.accept("keyword", "DESC"):
+            return name, True
+        self.accept("keyword", "ASC")
+        return name, False
+
+    def expression(self) -> ColumnElement[bool]:
+        clauses = [self.term()]
+        while self.accept("keyword", "OR"):
+            clauses.append(self.term())
+        return clauses[0] if len(clauses) == 1 else or_(*clauses)
+
+    def term(self) -> ColumnElement[bool]:
+        clauses = [self.factor()]
+        while self.accept("keyword", "AND"):
+            clauses.append(self.factor())
+        return clauses[0] if len(clauses) == 1 else and_(*clauses)
+
+    def factor(self) -> ColumnElement[bool]:
+        if self.accept("keyword", "NOT") or self.accept("op", "!"):
+            # Spelt as an equality so that it can use ix_task_complete_due.
+            if self.peek() == Token("word", "complete") and not self._comparison_next():
+                self.position += 1
+                self.fields.add("complete")
+                return col(Task.complete) == false()
+            return not_(self.factor())
+        if self.accept("op", "("):
+            clause = self.expression()
+            self.expect("op", ")")
+            return clause
+        tag = self.accept("tag")
+        if tag is not None:
+            return has_tag(tag.value[1:])
+        name = self.expect("word").value
+        if name not in FIELDS:
+            raise QueryError(f"Unknown field {name!r}")
+        self.fields.add(name)
+        token = self.peek()
+        if token is None or token.kind != "op" or token.value not in COMPARISONS:
+            if name == "complete":
+                return col(Task.complete) == true()
+            raise QueryError(f"Expected a comparison after {name!r}")
+        self.position += 1
+        return compare(name, token.value, self.value())
+
+    def _comparison_next(self) -> bool:
+        following = self.position + 1
+        if following >= len(self.tokens):
+            return False
+        token = self.tokens[following]
+        return token.kind == "op" and token.value in COMPARISONS
+
+    def value(self) -> Any:
+        token = self.peek()
+        if token is None:
+            raise QueryError("Expected a value, found end of query")
+        self.position += 1
+        if token.kind == "number":
+            number = int(token.value)
+            if number > MAX_INTEGER:
+                raise QueryError(f"Number {token.value} is too large")
+            return number
+        if token.kind == "string":
+            return re.sub(r"\\(.)", r"\1", token.value[1:-1])
+        if token.kind == "date":
+            try:
+                return date.fromisoformat(token.value)
+            except ValueError:
+                raise QueryError(f"Invalid date {token.value!r}") from None
+        if token.kind == "keyword" and token.value in ("TRUE", "FALSE"):
+            return token.value == "TRUE"
+        if token.kind == "keyword" and token.value in ("NULL", "TODAY"):
+            return token.value
+        raise QueryError(f"Expected a value, found {token.value!r}")
+
+
+OPERATORS: dict[str, Callable[[Any, Any], ColumnElement[bool]]] = {
+    "=": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    "<": lambda a, b: a < b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    ">=": lambda a, b: a >= b,
+}
+
+
+def has_tag(name: str) -> ColumnElement[bool]:
+    """Whether the task has tag ``name``.
+
+    Tag ids differ between shards, so the tag is looked up by name. As an
+    ``IN`` list SQLite can drive the query from the tag's ``task_tag`` index
+    range instead of probing it for every task.
+    """
+    tagged = (
+        select(TaskTag.task_id)
+        .join(Tag, col(Tag.id) == col(TaskTag.tag_id))
+        .where(col(Tag.name) == normalize_tag(name))
+    )
+    return col(Task.id).in_(tagged)
+
+
+def compare(name: str, op: str, value: Any) -> ColumnElement[bool]:
+    """SQL for ``<field> <op> <value>``, checking the value's type."""
+
+    def require(condition: bool, expected: str) -> None:
+        if not condition:
+            raise QueryError(f"{name} {op} needs {expected}")
+
+    if value == "NULL":
+        require(op in ("=", "!=") and name != "tags", "= or != with null")
+        column = col(Task.project_id) if name == "project" else getattr(Task, name)
+        return column.is_(None) if op == "=" else column.is_not(None)
+
+    if name == "complete":
+        require(isinstance(value, bool) and op in ("=", "!="), "= or != true/false")
+        # Spelt as an equality so that it can use ix_task_complete_due.
+        return col(Task.complete) == (true() if value == (op == "=") else false())
+    if name == "priority":
+        require(isinstance(value, int) and not isinstance(value, bool), "a number")
+        return OPERATORS[op](col(Task.priority), value)
+    if name == "due":
+        if value == "TODAY":
+            value = bindparam("today", callable_=date.today, type_=Date, unique=True)
+        else:
+            require(isinstance(value, date), "a date, today or null")
+        return OPERATORS[op](col(Task.due), value)
+
+    require(isinstance(value, str) and op in ("=", "!="), '= or != "text"')
+    if name == "tags":
+        return has_tag(value) if op == "=" else not_(has_tag(value))
+    in_project = col(Task.project_id).in_(
+        select(Project.id).where(col(Project.name) == value)
+    )
+    if op == "=":
+        return in_project
+    return or_(col(Task.project_id).is_(None), not_(in_project))
+
+
+def sort_column(name: str) -> Any:
+    """The SQL expression a SORT key orders by."""
+    if name == "project":
+        return (
+            select(Project.name)
+            .where(col(Project.id) == col(Task.project_id))
+            .scalar_subquery()
+        )
+    return col(getattr(Task, name))
+
+
+def compile_query(text: str) -> QueryPlan:
+    """Parse ``text`` and build its (uncached) plan."""
+    tokens = tokenize(text)
+    where, sort, limit = _Parser(tokens).query()
+    sort_columns = [
+        sort_column(name).label(f"sort_{index}") for index, (name, _) in enumerate(sort)
+    ]
+    statement = (
+        select(Task, *sort_columns)
+        .options(selectinload(Task.tags))  # type: ignore[arg-type]
+        .where(where)
+        .order_by(
+            *[
+                column.desc() if descending else column.asc()
+                for column, (_, descending) in zip(sort_columns, sort)
+            ],
+            col(Task.id),
+        )
+    )
+    if limit is not None:
+        statement = statement.limit(limit)
+    return QueryPlan(normalize(tokens), statement, limit, sort)
+
+
+class QueryPlanCache:
+    """LRU cache of compiled plans, keyed by normalised query text."""
+
+    def __init__(self, max_size: int = QUERY_PLAN_CACHE_SIZE):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._plans: OrderedDict[str, QueryPlan] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, text: str) -> QueryPlan:
+        """Return the plan for ``text``, compiling it on a miss."""
+        key = normalize(tokenize(text))
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.hits += 1
+                return plan
+            self.misses += 1
+        plan = compile_query(text)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def clear(self) -> None:
+        """Drop every cached plan."""
+        with self._lock:
+            self._plans.clear()
+
+
+plans = QueryPlanCache()
+
+
+def explain_steps(session: Session, plan: QueryPlan) -> list[str]:
+    """Run EXPLAIN QUERY PLAN for ``plan``; one line per plan step."""
+    assert session.bind is not None
+    compiled = plan.statement.compile(
+        dialect=session.bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+    rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+    return [row[3] for row in rows]
+
+
+def prepare(registry: ShardRegistry, text: str) -> QueryPlan:
+    """Look up the plan for ``text`` and make sure it has its EXPLAIN steps."""
+    plan = plans.get(text)
+    if plan.steps is None:
+        # Every shard has the same schema, so one plan serves them all.
+        with registry.default.read_session() as session:
+            plan.steps = explain_steps(session, plan)
+    return plan
+
+
+def _sort_value(value: Any) -> tuple[bool, Any]:
+    # NULLs first, as SQLite sorts them in ascending order.
+    return value is not None, value
+
+
+def run_query(registry: ShardRegistry, text: str) -> list[TaskPublic]:
+    """Run a query over every shard, merging results in query order."""
+    plan = prepare(registry, text)
+    if plan.limit is None and plan.full_scan:
+        raise QueryError(
+            "Query would scan every task; add a LIMIT or filter on an indexed "
+            "field (!complete, due, tags)"
+        )
+
+    def query(shard: Shard) -> list[tuple[TaskPublic, tuple[Any, ...]]]:
+        with shard.read_session() as session:
+            rows = session.exec(plan.statement).all()  # type: ignore[call-overload]
+            if not plan.sort:
+                # Without sort columns SQLModel returns bare Task objects.
+                return [(shard.public(task), ()) for task in rows]
+            return [(shard.public(row[0]), tuple(row[1:])) for row in rows]
+
+    rows = [row for shard_rows in fan_out(registry, query) for row in shard_rows]
+    if len(registry) > 1:
+        # Stable sorts from the last key to the first, then the id tiebreak.
+        rows.sort(key=lambda row: row[0].id)
+        for index in reversed(range(len(plan.sort))):
+            rows.sort(
+                key=lambda row: _sort_value(row[1][index]),
+                reverse=plan.sort[index][1],
+            )
+    tasks = [task for task, _ in rows]
+    return tasks[: plan.limit] if plan.limit is not None else tasks
+
+
+def explain(registry: ShardRegistry, text: str) -> QueryExplain:
+    """Describe how a query is run, without running it."""
+    plan = prepare(registry, text)
+    assert plan.steps is not None
+    return QueryExplain(
+        query=plan.text,
+        sql=str(plan.statement.compile(registry.default.engine)),
+        plan=plan.steps,
+        full_scan=plan.full_scan,
+        rejected=plan.limit is None and plan.full_scan,
+    )
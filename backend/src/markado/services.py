@@ -4,19 +4,60 @@ This module provides helper functions that operate on the database via SQLModel
 sessions, such as listing, creating, and updating Task records.
 """
 
+from datetime import date
 from typing import cast
 
-from sqlmodel import Session, select
+from sqlalchemy import false
+from sqlalchemy.orm import selectinload
+from sqlmodel import Session, col, func, select
 
+from markado import tags
 from markado.database import engine
-from markado.models import Task, TaskCreate, TaskUpdate
+from markado.models import Task, TaskCreate, TaskStats, TaskUpdate
+from markado.tags import TagFilter
+
+
+def list_tasks(
+    session: Session,
+    *,
+    offset: int = 0,
+    limit: int = 100,
+    q: str | None = None,
+    tag_filter: TagFilter | None = None,
+) -> list[Task]:
+    """Retrieve a list of Task records, ordered by ID, optionally filtered."""
+    statement = select(Task).options(selectinload(Task.tags))  # type: ignore[arg-type]
+    if q:
+        statement = statement.where(col(Task.name).contains(q))
+    if tag_filter:
+        statement = statement.where(tags.tag_filter_clause(session, tag_filter))
+    statement = statement.order_by(col(Task.id)).offset(offset).limit(limit)
+    tasks = cast(list[Task], session.exec(statement).all())
+    return tasks
 
 
-def list_tasks(session: Session, *, offset: int = 0, limit: int = 100) -> list[Task]:
-    """Retrieve a list of Task records from the database."""
-    result = session.exec(select(Task).offset(offset).limit(limit))
-    tasks = cast(list[Task], result.all())
-    return tasks
+def task_stats(session: Session) -> TaskStats:
+    """Count tasks in total and by completion."""
+    total, complete = session.exec(
+        select(func.count(), func.coalesce(func.sum(col(Task.complete)), 0))
+    ).one()
+    return TaskStats(total=total, complete=complete)
+
+
+def list_due_tasks(session: Session, start: date, end: date) -> list[Task]:
+    """Retrieve open tasks due in ``[start, end)``, ordered by due date.
+
+    Written to match ``ix_task_complete_due`` so SQLite answers it with a range
+    scan on the index rather than a scan of the task table.
+    """
+    statement = (
+        select(Task)
+        .options(selectinload(Task.tags))  # type: ignore[arg-type]
+        .where(col(Task.complete) == false())
+        .where(col(Task.due) >= start, col(Task.due) < end)
+        .order_by(col(Task.due), col(Task.id))
+    )
+    return cast(list[Task], session.exec(statement).all())
 
 
 def get_task(session: Session, task_id: int) -> Task | None:
@@ -25,9 +66,23 @@ def get_task(session: Session, task_id: int) -> Task | None:
     return task
 
 
+def get_tasks_by_ids(session: Session, task_ids: list[int]) -> list[Task]:
+    """Retrieve the Tasks with the given IDs, in the order given."""
+    if not task_ids:
+        return []
+    statement = (
+        select(Task)
+        .options(selectinload(Task.tags))  # type: ignore[arg-type]
+        .where(col(Task.id).in_(task_ids))
+    )
+    by_id = {task.id: task for task in session.exec(statement).all()}
+    return [by_id[task_id] for task_id in task_ids if task_id in by_id]
+
+
 def create_task(session: Session, task_create: TaskCreate) -> Task:
     """Create a new Task record in the database."""
-    db_task = Task.model_validate(task_create)
+    db_task = Task.model_validate(task_create.model_dump(exclude={"tags"}))
+    tags.set_task_tags(session, db_task, task_create.tags)
     session.add(db_task)
     session.commit()
     session.refresh(db_task)
@@ -51,7 +106,10 @@ def update_task(session: Session, task_id: int, task_update: TaskUpdate) -> Task
     if not db_task:
         return None
     task_data = task_update.model_dump(exclude_unset=True)
+    tag_names = task_data.pop("tags", None)
     db_task.sqlmodel_update(task_data)
+    if tag_names is not None:
+        tags.set_task_tags(session, db_task, tag_names)
     session.add(db_task)
     session.commit()
     session.refresh(db_task)
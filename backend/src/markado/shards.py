@@ -0,0 +1,332 @@
+"""One SQLite index shard per vault, with fan-out queries across shards.
+
+Each directory listed in ``VAULT_DIRS`` (separated like ``PATH``) gets its
+own SQLite file under ``SHARD_DIR``, so reindexing or writing one vault never
+takes a lock on another. The "default" shard on ``DATABASE_PATH`` is always
+served as well, first, so tasks created before any vault was configured stay
+visible and tasks created without a vault still go there.
+
+Public task ids encode the shard: the high bits hold the shard number (a
+stable hash of the vault name, 0 for the default shard) and the low
+``LOCAL_ID_BITS`` the row id inside the shard. Ids stay below 2**53 so they
+survive JSON clients that use doubles.
+"""
+
+import heapq
+import logging
+import os
+import threading
+import zlib
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import TypeVar
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import Engine
+from sqlmodel import Session
+
+from markado import services, tags
+from markado.database import (
+    BASE_DIR,
+    WRITER_MODE,
+    db_path,
+    engine,
+    make_engine,
+    read_engine,
+)
+from markado.models import Task, TaskPublic, TaskStats
+from markado.tags import TagFilter
+
+logger = logging.getLogger(__name__)
+
+VAULT_DIRS = os.getenv("VAULT_DIRS", "")
+SHARD_DIR = Path(os.getenv("SHARD_DIR", f"{db_path}.shards"))
+FANOUT_WORKERS = int(os.getenv("FANOUT_WORKERS", 8))
+# With several shards each one reads offset + limit rows for a page, so deep
+# offsets are refused there; a single shard pages in SQL without a limit.
+MAX_FANOUT_OFFSET = 10_000
+
+LOCAL_ID_BITS = 40
+SHARD_BITS = 12
+LOCAL_ID_MASK = (1 << LOCAL_ID_BITS) - 1
+DEFAULT_SHARD = "default"
+
+R = TypeVar("R")
+
+
+def shard_number(name: str) -> int:
+    """Stable shard number for a vault name, in 1..2**SHARD_BITS - 1."""
+    return zlib.crc32(name.encode()) % ((1 << SHARD_BITS) - 1) + 1
+
+
+def encode_task_id(number: int, local_id: int) -> int:
+    """Build the public id of row ``local_id`` in shard ``number``."""
+    return (number << LOCAL_ID_BITS) | local_id
+
+
+def decode_task_id(task_id: int) -> tuple[int, int]:
+    """Split a public task id into (shard number, local row id)."""
+    return task_id >> LOCAL_ID_BITS, task_id & LOCAL_ID_MASK
+
+
+class Shard:
+    """A vault and the SQLite file holding its index."""
+
+    def __init__(
+        self,
+        name: str,
+        number: int,
+        path: Path,
+        vault_dir: Path | None = None,
+        *,
+        db_engine: Engine | None = None,
+        db_read_engine: Engine | None = None,
+    ):
+        self.name = name
+        self.number = number
+        self.path = path
+        self.vault_dir = vault_dir
+        self.engine = db_engine or make_engine(path)
+        self.read_engine = db_read_engine or make_engine(path, read_only=True)
+
+    def session(self) -> Session:
+        """Open a read-write session on this shard."""
+        return Session(self.engine)
+
+    def read_session(self) -> Session:
+        """Open a session for reads; read-only when writes go through IPC."""
+        return Session(self.read_engine if WRITER_MODE == "ipc" else self.engine)
+
+    def public(self, task: Task) -> TaskPublic:
+        """Convert a shard row into its public form, with the global id."""
+        assert task.id is not None
+        return TaskPublic.model_validate(
+            task,
+            update={
+                "id": encode_task_id(self.number, task.id),
+                "tags": [tag.name for tag in task.tags],
+            },
+        )
+
+    def migrate(self) -> None:
+        """Bring this shard's schema up to the latest Alembic revision."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        config = Config()
+        config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+        # Not engine.begin(): Alembic manages the transactions itself, so
+        # migrations can commit per revision and per backfill chunk.
+        with self.engine.connect() as connection:
+            config.attributes["connection"] = connection
+            command.upgrade(config, "head")
+
+    def close(self) -> None:
+        """Release this shard's connections."""
+        self.engine.dispose()
+        self.read_engine.dispose()
+
+
+class ShardRegistry:
+    """The set of open shards, addressable by vault name or shard number."""
+
+    def __init__(self, shards: Iterable[Shard] = ()):
+        self._lock = threading.Lock()
+        # Replaced, never mutated, so readers can iterate without the lock.
+        self._shards: dict[str, Shard] = {}
+        for shard in shards:
+            self.add(shard)
+
+    def __iter__(self) -> Iterator[Shard]:
+        return iter(list(self._shards.values()))
+
+    def __len__(self) -> int:
+        return len(self._shards)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._shards
+
+    @property
+    def default(self) -> Shard:
+        """The shard new tasks go to when no vault is given."""
+        return next(iter(self._shards.values()))
+
+    def get(self, name: str) -> Shard:
+        """Look up a shard by vault name; raises KeyError if unknown."""
+        return self._shards[name]
+
+    def add(self, shard: Shard) -> None:
+        """Register an open shard; names and numbers must be unique."""
+        with self._lock:
+            for other in self._shards.values():
+                if other.name == shard.name or other.number == shard.number:
+                    raise ValueError(
+                        f"Vault {shard.name!r} clashes with {other.name!r}; "
+                        "rename one of the vault directories"
+                    )
+            self._shards = {**self._shards, shard.name: shard}
+
+    def add_vault(self, vault_dir: Path, *, migrate: bool = True) -> Shard:
+        """Open (creating if needed) the shard for ``vault_dir``.
+
+        Only the new shard's file is created and migrated.
+        """
+        name = vault_dir.name
+        shard = Shard(name, shard_number(name), SHARD_DIR / f"{name}.db", vault_dir)
+        if migrate:
+            shard.migrate()
+        try:
+            self.add(shard)
+        except ValueError:
+            shard.close()
+            raise
+        logger.info(f"Opened shard {name} ({shard.number}) at {shard.path}")
+        return shard
+
+    def remove(self, name: str) -> Shard:
+        """Stop serving a vault; its shard file is left on disk."""
+        with self._lock:
+            shards = dict(self._shards)
+            shard = shards.pop(name)
+            self._shards = shards
+        shard.close()
+        return shard
+
+    def for_task_id(self, task_id: int) -> tuple[Shard, int] | None:
+        """Find the shard and local row id for a public task id."""
+        number, local_id = decode_task_id(task_id)
+        for shard in self._shards.values():
+            if shard.number == number:
+                return shard, local_id
+        return None
+
+    def migrate(self) -> None:
+        """Migrate every vault shard (the default one is migrated by hand)."""
+        for shard in self:
+            if shard.vault_dir is not None:
+                shard.migrate()
+
+    def close(self) -> None:
+        """Close every shard."""
+        for shard in self:
+            shard.close()
+
+
+def default_registry() -> ShardRegistry:
+    """Build the registry: the default shard plus one per ``VAULT_DIRS`` entry."""
+    default = Shard(
+        DEFAULT_SHARD,
+        0,
+        db_path,
+        db_engine=engine,
+        db_read_engine=read_engine,
+    )
+    registry = ShardRegistry([default])
+    vault_dirs = [Path(p).expanduser() for p in VAULT_DIRS.split(os.pathsep) if p]
+    for vault_dir in vault_dirs:
+        # In "ipc" mode workers only read; the writer migrates when it starts.
+        registry.add_vault(vault_dir, migrate=WRITER_MODE != "ipc")
+    return registry
+
+
+_registry: ShardRegistry | None = None
+_registry_lock = threading.Lock()
+_executor = ThreadPoolExecutor(
+    max_workers=FANOUT_WORKERS, thread_name_prefix="shard-fanout"
+)
+
+
+def get_shards() -> ShardRegistry:
+    """Dependency returning the process-wide shard registry."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = default_registry()
+    return _registry
+
+
+def fan_out(registry: ShardRegistry, query: Callable[[Shard], R]) -> list[R]:
+    """Run ``query`` on every shard concurrently; results in shard order."""
+    shards = list(registry)
+    if len(shards) == 1:
+        return [query(shards[0])]
+    return list(_executor.map(query, shards))
+
+
+def _shard_tasks(
+    shard: Shard,
+    *,
+    offset: int,
+    limit: int,
+    q: str | None,
+    tag_filter: TagFilter | None,
+) -> list[TaskPublic]:
+    with shard.read_session() as session:
+        task_ids = None
+        if tag_filter and not q:
+            task_ids = tags.bitmaps.task_ids(
+                session, shard.name, tag_filter, offset, limit
+            )
+        if task_ids is not None:
+            tasks = services.get_tasks_by_ids(session, task_ids)
+        else:
+            tasks = services.list_tasks(
+                session, offset=offset, limit=limit, q=q, tag_filter=tag_filter
+            )
+        return [shard.public(task) for task in tasks]
+
+
+def list_tasks(
+    registry: ShardRegistry,
+    *,
+    offset: int = 0,
+    limit: int = 100,
+    q: str | None = None,
+    tag_filter: TagFilter | None = None,
+) -> list[TaskPublic]:
+    """List tasks from all shards, ordered by public id.
+
+    Tag filters over hot tags are answered from in-memory bitmaps, the rest
+    from the ``task_tag`` indexes.
+    """
+    if len(registry) == 1:
+        return _shard_tasks(
+            registry.default, offset=offset, limit=limit, q=q, tag_filter=tag_filter
+        )
+
+    # Every shard has to supply its first offset + limit rows, since the page
+    # may come entirely from any one of them.
+    def query(shard: Shard) -> list[TaskPublic]:
+        return _shard_tasks(
+            shard, offset=0, limit=offset + limit, q=q, tag_filter=tag_filter
+        )
+
+    merged = heapq.merge(*fan_out(registry, query), key=lambda task: task.id)
+    return list(islice(merged, offset, offset + limit))
+
+
+def get_task(registry: ShardRegistry, task_id: int) -> TaskPublic | None:
+    """Fetch one task by public id from the shard it lives in."""
+    found = registry.for_task_id(task_id)
+    if found is None:
+        return None
+    shard, local_id = found
+    with shard.read_session() as session:
+        task = services.get_task(session, local_id)
+        return shard.public(task) if task else None
+
+
+def task_stats(registry: ShardRegistry) -> TaskStats:
+    """Sum task counts over all shards."""
+
+    def query(shard: Shard) -> TaskStats:
+        with shard.read_session() as session:
+            return services.task_stats(session)
+
+    stats = TaskStats()
+    for shard_stats in fan_out(registry, query):
+        stats.total += shard_stats.total
+        stats.complete += shard_stats.complete
+    return stats
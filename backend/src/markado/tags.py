@@ -0,0 +1,320 @@
+"""Normalised task tags and AND/OR/NOT tag filtering.
+
+Tags live in the ``tag`` table and are linked to tasks through ``task_tag``,
+whose primary key serves "tags of a task" and whose ``(tag_id, task_id)``
+index serves "tasks with a tag". A filter such as ``#work AND #urgent NOT
+#waiting`` is answered from those indexes without touching task rows that
+don't match.
+
+For the most queried tags, ``TagBitmaps`` keeps each tag's task ids in memory
+as a bitset, so filters over hot tags become a few big-integer operations. It
+is off in "ipc" mode, where this process doesn't see other workers' writes.
+"""
+
+import os
+import threading
+from collections import Counter
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass, field
+
+from sqlalchemy import ColumnElement, and_, exists, false, func, not_, true
+from sqlmodel import Session, col, select
+
+from markado.database import WRITER_MODE
+from markado.models import Tag, Task, TaskTag
+
+TAG_BITMAPS = os.getenv("TAG_BITMAPS", "on").lower() not in ("0", "off", "false")
+# A tag gets a bitmap once it has been filtered on this many times...
+HOT_TAG_THRESHOLD = int(os.getenv("HOT_TAG_THRESHOLD", 3))
+# ...and at most this many tags per shard keep one...
+MAX_TAG_BITMAPS = int(os.getenv("MAX_TAG_BITMAPS", 64))
+# ...within this many bytes for all bitmaps together. A bitmap costs one bit
+# per task id up to its highest id, however few tasks have the tag.
+MAX_TAG_BITMAP_BYTES = int(os.getenv("MAX_TAG_BITMAP_BYTES", 32 * 1024 * 1024))
+# Filter counts are kept for at most this many tags; past that they are halved
+# and the ones that reach zero forgotten, so only recently hot tags stay.
+MAX_COUNTED_TAGS = 4096
+# A required tag on fewer tasks than this drives a filter from its index;
+# for commoner tags a scan in id order finds a page of matches sooner.
+DRIVING_TAG_MAX = 2_000
+
+
+def normalize_tag(name: str) -> str:
+    """Tags are matched without their ``#`` and case-insensitively."""
+    return name.strip().lstrip("#").lower()
+
+
+@dataclass
+class TagFilter:
+    """Tasks must have every ``all_of`` tag, one ``any_of`` tag, no ``none_of``."""
+
+    all_of: list[str] = field(default_factory=list)
+    any_of: list[str] = field(default_factory=list)
+    none_of: list[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.all_of = sorted({normalize_tag(t) for t in self.all_of})
+        self.any_of = sorted({normalize_tag(t) for t in self.any_of})
+        self.none_of = sorted({normalize_tag(t) for t in self.none_of})
+
+    def __bool__(self) -> bool:
+        return bool(self.all_of or self.any_of or self.none_of)
+
+    def names(self) -> set[str]:
+        """Every tag the filter mentions."""
+        return {*self.all_of, *self.any_of, *self.none_of}
+
+
+def get_or_create_tags(session: Session, names: Iterable[str]) -> list[Tag]:
+    """Return the Tag rows for ``names``, creating the missing ones."""
+    wanted = sorted({normalize_tag(name) for name in names} - {""})
+    if not wanted:
+        return []
+    existing = session.exec(select(Tag).where(col(Tag.name).in_(wanted))).all()
+    by_name = {tag.name: tag for tag in existing}
+    for name in wanted:
+        if name not in by_name:
+            by_name[name] = Tag(name=name)
+            session.add(by_name[name])
+    return [by_name[name] for name in wanted]
+
+
+def set_task_tags(session: Session, task: Task, names: Iterable[str]) -> None:
+    """Replace the tags of ``task`` (not committed)."""
+    task.tags = get_or_create_tags(session, names)
+
+
+def tag_ids(session: Session, names: Iterable[str]) -> dict[str, int]:
+    """Map the given tag names to ids; unknown names are left out."""
+    names = list(names)
+    if not names:
+        return {}
+    rows = session.exec(select(Tag.name, Tag.id).where(col(Tag.name).in_(names)))
+    return {name: tag_id for name, tag_id in rows.all() if tag_id is not None}
+
+
+def tag_count(session: Session, tag_id: int, cap: int) -> int:
+    """Number of tasks with a tag, counting no further than ``cap``."""
+    postings = (
+        select(TaskTag.task_id).where(col(TaskTag.tag_id) == tag_id).limit(cap)
+    ).subquery()
+    return session.exec(select(func.count()).select_from(postings)).one()
+
+
+def tag_filter_clause(session: Session, tag_filter: TagFilter) -> ColumnElement[bool]:
+    """Build a WHERE clause on ``task`` for ``tag_filter``.
+
+    The rarest required tag (or the ``any_of`` tags) drives the query: its
+    ``(tag_id, task_id)`` index range gives the candidate ids in id order, and
+    every other tag is a lookup on the ``task_tag`` primary key. When every
+    required tag is common, tasks are walked in id order instead and checked
+    against the primary key, which fills a page of results sooner than
+    reading a long index range.
+    """
+    ids = tag_ids(session, tag_filter.names())
+    if any(name not in ids for name in tag_filter.all_of):
+        return false()
+    all_ids = [ids[name] for name in tag_filter.all_of]
+    any_ids = [ids[name] for name in tag_filter.any_of if name in ids]
+    if tag_filter.any_of and not any_ids:
+        return false()
+    none_ids = [ids[name] for name in tag_filter.none_of if name in ids]
+
+    def tagged(tag_id_in: list[int]) -> ColumnElement[bool]:
+        task_ids = select(TaskTag.task_id).where(col(TaskTag.tag_id).in_(tag_id_in))
+        return col(Task.id).in_(task_ids)
+
+    def has_tag(tag_id_in: list[int]) -> ColumnElement[bool]:
+        return exists().where(
+            col(TaskTag.task_id) == col(Task.id), col(TaskTag.tag_id).in_(tag_id_in)
+        )
+
+    clauses = []
+    counts = {tag_id: tag_count(session, tag_id, DRIVING_TAG_MAX) for tag_id in all_ids}
+    all_ids.sort(key=counts.__getitem__)
+    if all_ids and counts[all_ids[0]] < DRIVING_TAG_MAX:
+        clauses.append(tagged(all_ids[:1]))
+        all_ids = all_ids[1:]
+    elif not all_ids and any_ids:
+        clauses.append(tagged(any_ids))
+        any_ids = []
+    clauses.extend(has_tag([tag_id]) for tag_id in all_ids)
+    if any_ids:
+        clauses.append(has_tag(any_ids))
+    if none_ids:
+        clauses.append(not_(has_tag(none_ids)))
+    return and_(true(), *clauses)
+
+
+def iter_bits(bits: int) -> Iterator[int]:
+    """Yield the positions of the set bits of ``bits``, lowest first."""
+    data = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            yield index * 8 + low.bit_length() - 1
+            byte ^= low
+
+
+def bits_from_ids(ids: Iterable[int]) -> int:
+    """Build a bitset with the bits at ``ids`` set."""
+    ids = list(ids)
+    if not ids:
+        return 0
+    data = bytearray(max(ids) // 8 + 1)
+    for task_id in ids:
+        data[task_id >> 3] |= 1 << (task_id & 7)
+    return int.from_bytes(data, "little")
+
+
+def bitmap_size(bits: int) -> int:
+    """Bytes used by the bits of bitset ``bits``."""
+    return (bits.bit_length() + 7) // 8
+
+
+class TagBitmaps:
+    """In-memory bitsets of task ids for the hottest tags, per shard.
+
+    A bitset is a Python int with bit ``n`` set when task ``n`` has the tag.
+    Python ints only store up to the highest set bit, and AND/OR/ANDNOT run
+    in C over whole machine words. A rare tag on a recent task still costs a
+    bit per task id, so bitmaps are only kept within ``MAX_TAG_BITMAP_BYTES``.
+    """
+
+    def __init__(self, enabled: bool = True, threshold: int = HOT_TAG_THRESHOLD):
+        self.enabled = enabled
+        self.threshold = threshold
+        self._bitmaps: dict[tuple[str, str], int] = {}
+        self._hits: Counter[tuple[str, str]] = Counter()
+        self._generations: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    def task_ids(
+        self,
+        session: Session,
+        shard_name: str,
+        tag_filter: TagFilter,
+        offset: int,
+        limit: int,
+    ) -> list[int] | None:
+        """Matching task ids in order, or None if the filter isn't all hot.
+
+        Only filters with at least one ``all_of``/``any_of`` tag can be
+        answered, since ``none_of`` alone would need the set of all tasks.
+        """
+        if not self.enabled or not (tag_filter.all_of or tag_filter.any_of):
+            return None
+        bitmaps = self._lookup(session, shard_name, tag_filter.names())
+        if bitmaps is None:
+            return None
+
+        bits = -1
+        for name in tag_filter.all_of:
+            bits &= bitmaps[name]
+        if tag_filter.any_of:
+            any_bits = 0
+            for name in tag_filter.any_of:
+                any_bits |= bitmaps[name]
+            bits &= any_bits
+        for name in tag_filter.none_of:
+            bits &= ~bitmaps[name]
+        ids = iter_bits(bits)
+        return [task_id for _, task_id in zip(range(offset + limit), ids)][offset:]
+
+    def invalidate(self, shard_name: str, names: Iterable[str] | None = None) -> None:
+        """Drop the bitmaps of ``names`` in a shard (all of them if None)."""
+        with self._lock:
+            self._generations[shard_name] += 1
+            if names is None:
+                for key in [k for k in self._bitmaps if k[0] == shard_name]:
+                    del self._bitmaps[key]
+                return
+            for name in names:
+                self._bitmaps.pop((shard_name, normalize_tag(name)), None)
+
+    def clear(self) -> None:
+        """Drop everything."""
+        with self._lock:
+            self._bitmaps.clear()
+            self._hits.clear()
+
+    def _lookup(
+        self, session: Session, shard_name: str, names: set[str]
+    ) -> dict[str, int] | None:
+        ids = tag_ids(session, names)
+        # Unknown tags match no task, and aren't counted: filter names come
+        # from requests, so counting them would let the counter grow forever.
+        found = dict.fromkeys(names - ids.keys(), 0)
+        with self._lock:
+            generation = self._generations[shard_name]
+            cold = []
+            for name in ids:
+                key = (shard_name, name)
+                self._count(key)
+                if key in self._bitmaps:
+                    found[name] = self._bitmaps[key]
+                else:
+                    cold.append(name)
+            if any(self._hits[(shard_name, name)] < self.threshold for name in cold):
+                return None
+            if not cold:
+                return found
+            loaded = sum(1 for key in self._bitmaps if key[0] == shard_name)
+            if loaded + len(cold) > MAX_TAG_BITMAPS:
+                return None
+
+        # Check the size from the highest ids before reading whole postings.
+        max_ids = max_task_ids(session, [ids[name] for name in cold])
+        needed = sum(max_id // 8 + 1 for max_id in max_ids.values())
+        with self._lock:
+            if self._used_bytes() + needed > MAX_TAG_BITMAP_BYTES:
+                return None
+        for name, bits in self._load(session, {n: ids[n] for n in cold}).items():
+            found[name] = bits
+        with self._lock:
+            # A write while loading may have made the new bitmaps stale, and
+            # other loads may have used up the budget meanwhile.
+            needed = sum(bitmap_size(found[name]) for name in cold)
+            if (
+                self._generations[shard_name] == generation
+                and self._used_bytes() + needed <= MAX_TAG_BITMAP_BYTES
+            ):
+                for name in cold:
+                    self._bitmaps[(shard_name, name)] = found[name]
+        return found
+
+    def _used_bytes(self) -> int:
+        return sum(bitmap_size(bits) for bits in self._bitmaps.values())
+
+    def _count(self, key: tuple[str, str]) -> None:
+        self._hits[key] += 1
+        while len(self._hits) > MAX_COUNTED_TAGS:
+            self._hits = Counter(
+                {k: hits // 2 for k, hits in self._hits.items() if hits > 1}
+            )
+
+    def _load(self, session: Session, ids: dict[str, int]) -> dict[str, int]:
+        result = {}
+        for name, tag_id in ids.items():
+            rows = session.exec(
+                select(TaskTag.task_id).where(col(TaskTag.tag_id) == tag_id)
+            )
+            result[name] = bits_from_ids(t for t in rows.all() if t is not None)
+        return result
+
+
+def max_task_ids(session: Session, tag_id_in: list[int]) -> dict[int, int]:
+    """Highest task id with each tag, from the ``(tag_id, task_id)`` index."""
+    rows = session.exec(
+        select(TaskTag.tag_id, func.max(TaskTag.task_id))
+        .where(col(TaskTag.tag_id).in_(tag_id_in))
+        .group_by(col(TaskTag.tag_id))
+    )
+    return {
+        tag_id: max_id
+        for tag_id, max_id in rows.all()
+        if tag_id is not None and max_id is not None
+    }
+
+
+bitmaps = TagBitmaps(enabled=TAG_BITMAPS and WRITER_MODE != "ipc")
@@ -0,0 +1,441 @@
+"""Single-writer support for running several API workers on one SQLite file.
+
+SQLite allows any number of readers but only one writer. When uvicorn is run
+with ``--workers N`` and ``WRITER_MODE=ipc``, each worker serves reads from its
+own read-only connections and sends every write to a single writer over a
+local Unix socket. The writer is either a dedicated process
+(``python -m markado.writer``) or, if none is running, the first worker to
+grab the writer lock file.
+
+The writer commits before it replies, so a client that reads after its write
+returned always sees that write.
+"""
+
+import fcntl
+import logging
+import os
+import socket
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from pathlib import Path
+from typing import IO, Any, Protocol
+
+from markado import agenda, jobs, services, tags
+from markado.database import WRITER_MODE, db_path
+from markado.models import JobPublic, TaskCreate, TaskPublic, TaskUpdate
+from markado.shards import ShardRegistry, get_shards
+
+logger = logging.getLogger(__name__)
+
+WRITER_ADDRESS = os.getenv("WRITER_ADDRESS", f"{db_path}.writer.sock")
+WRITER_LOCK_PATH = os.getenv("WRITER_LOCK_PATH", f"{db_path}.writer.lock")
+WRITER_AUTHKEY = os.getenv("SECRET_KEY", "change-me").encode()
+
+
+class WriterError(Exception):
+    """Raised when the writer rejects a request or cannot be reached."""
+
+
+class TaskWriter(Protocol):
+    """Write operations shared by the in-process and IPC writers."""
+
+    def create_task(
+        self, task_create: TaskCreate, vault: str | None = None
+    ) -> TaskPublic:
+        """Create a task in ``vault`` (the default shard if None)."""
+        ...
+
+    def update_task(self, task_id: int, task_update: TaskUpdate) -> TaskPublic | None:
+        """Apply ``task_update``; returns None if the task doesn't exist."""
+        ...
+
+    def delete_task(self, task_id: int) -> bool:
+        """Delete a task; returns whether it existed."""
+        ...
+
+    def start_resync(self, vault: str | None = None) -> JobPublic:
+        """Queue a resync of ``vault`` (all vaults if None)."""
+        ...
+
+    def get_job(self, job_id: str) -> JobPublic | None:
+        """Look up a background job."""
+        ...
+
+    def cancel_job(self, job_id: str) -> JobPublic | None:
+        """Ask a background job to stop."""
+        ...
+
+
+class LocalTaskWriter:
+    """Writes directly to the shard files (single-worker mode)."""
+
+    def __init__(self, registry: ShardRegistry):
+        self.registry = registry
+
+    def create_task(
+        self, task_create: TaskCreate, vault: str | None = None
+    ) -> TaskPublic:
+        """Create the task and invalidate the caches it affects."""
+        shard = self.registry.get(vault) if vault else self.registry.default
+        with shard.session() as session:
+            task = services.create_task(session, task_create)
+            agenda.cache.invalidate(shard.name, [task.due])
+            tags.bitmaps.invalidate(shard.name, task_create.tags)
+            return shard.public(task)
+
+    def update_task(self, task_id: int, task_update: TaskUpdate) -> TaskPublic | None:
+        """Update the task in its shard and invalidate old and new cache keys."""
+        found = self.registry.for_task_id(task_id)
+        if found is None:
+            return None
+        shard, local_id = found
+        with shard.session() as session:
+            old = services.get_task(session, local_id)
+            old_due = old.due if old else None
+            old_tags = [tag.name for tag in old.tags] if old else []
+            task = services.update_task(session, local_id, task_update)
+            if task is None:
+                return None
+            agenda.cache.invalidate(shard.name, [old_due, task.due])
+            tags.bitmaps.invalidate(shard.name, old_tags + (task_update.tags or []))
+            return shard.public(task)
+
+    def delete_task(self, task_id: int) -> bool:
+        """Delete the task from its shard and invalidate its cache keys."""
+        found = self.registry.for_task_id(task_id)
+        if found is None:
+            return False
+        shard, local_id = found
+        with shard.session() as session:
+            old = services.get_task(session, local_id)
+            old_due = old.due if old else None
+            old_tags = [tag.name for tag in old.tags] if old else []
+            deleted = services.delete_task(session, local_id)
+            if deleted:
+                agenda.cache.invalidate(shard.name, [old_due])
+                tags.bitmaps.invalidate(shard.name, old_tags)
+            return deleted
+
+    def start_resync(self, vault: str | None = None) -> JobPublic:
+        """Queue a resync on this process's job runner."""
+        return jobs.start_resync(self.registry, vault).public()
+
+    def get_job(self, job_id: str) -> JobPublic | None:
+        """Look up a job on this process's job runner."""
+        job = jobs.runner.get(job_id)
+        return job.public() if job else None
+
+    def cancel_job(self, job_id: str) -> JobPublic | None:
+        """Cancel a job on this process's job runner."""
+        job = jobs.runner.cancel(job_id)
+        return job.public() if job else None
+
+
+class WriterServer:
+    """Owns the only read-write connections and applies writes one at a time."""
+
+    def __init__(self, registry: ShardRegistry, address: str, authkey: bytes):
+        self.writer = LocalTaskWriter(registry)
+        self.address = address
+        self.authkey = authkey
+        self._write_lock = threading.Lock()
+        # A socket left behind by a crashed writer would make bind() fail.
+        # Only the lock holder gets here, so it is safe to remove.
+        Path(address).unlink(missing_ok=True)
+        self._listener = Listener(address, family="AF_UNIX", authkey=authkey)
+        self._closed = False
+        self._connections: set[Connection] = set()
+        self._connections_lock = threading.Lock()
+
+    def serve_forever(self) -> None:
+        """Accept clients until ``close`` is called."""
+        logger.info(f"Writer listening on {self.address}")
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except (OSError, EOFError, AuthenticationError):
+                if self._closed:
+                    break
+                logger.exception("Writer failed to accept a connection")
+                continue
+            if self._closed:
+                conn.close()
+                break
+            threading.Thread(
+                target=self._handle_connection, args=(conn,), daemon=True
+            ).start()
+
+    def start(self) -> threading.Thread:
+        """Run ``serve_forever`` in a daemon thread."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self) -> None:
+        """Stop accepting clients, drop connected ones and remove the socket."""
+        self._closed = True
+        # Wake up a serve_forever blocked in accept() so it can exit. A bare
+        # socket, not a Client: nothing may be left to answer a handshake.
+        with socket.socket(socket.AF_UNIX) as wake:
+            try:
+                wake.connect(self.address)
+            except OSError:
+                pass
+        self._listener.close()
+        Path(self.address).unlink(missing_ok=True)
+        # Let a write in progress finish, then cut every client off, so their
+        # next send fails and they reconnect (or elect a new writer) instead
+        # of waiting on a process that is going away.
+        with self._write_lock, self._connections_lock:
+            for conn in self._connections:
+                _shutdown(conn)
+
+    def _handle_connection(self, conn: Connection) -> None:
+        with self._connections_lock:
+            if self._closed:
+                conn.close()
+                return
+            self._connections.add(conn)
+        try:
+            self._serve_connection(conn)
+        finally:
+            with self._connections_lock:
+                self._connections.discard(conn)
+            conn.close()
+
+    def _serve_connection(self, conn: Connection) -> None:
+        while True:
+            try:
+                op, payload = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = ("ok", self._dispatch(op, payload))
+            except Exception as e:
+                logger.exception(f"Writer failed to apply {op}")
+                reply = ("error", f"{type(e).__name__}: {e}")
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+    def _dispatch(self, op: str, payload: dict[str, Any]) -> Any:
+        with self._write_lock:
+            if op == "create_task":
+                task_create = TaskCreate.model_validate(payload["task"])
+                task = self.writer.create_task(task_create, payload.get("vault"))
+                return task.model_dump()
+            if op == "update_task":
+                task_update = TaskUpdate.model_validate(payload["task"])
+                updated = self.writer.update_task(payload["task_id"], task_update)
+                return updated.model_dump() if updated else None
+            if op == "delete_task":
+                return self.writer.delete_task(payload["task_id"])
+            if op == "start_resync":
+                return self.writer.start_resync(payload.get("vault")).model_dump()
+            if op in ("get_job", "cancel_job"):
+                job = getattr(self.writer, op)(payload["job_id"])
+                return job.model_dump() if job else None
+            raise ValueError(f"Unknown writer operation: {op}")
+
+
+def _shutdown(conn: Connection) -> None:
+    """Shut a connection's socket down, waking a thread blocked reading it."""
+    try:
+        with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+class WriterClient:
+    """Sends writes to the writer; one connection per worker process."""
+
+    def __init__(
+        self,
+        address: str,
+        authkey: bytes,
+        *,
+        connect_timeout: float = 5.0,
+        on_connect_failure: Any = None,
+    ):
+        self.address = address
+        self.authkey = authkey
+        self.connect_timeout = connect_timeout
+        # Called when the writer cannot be reached, so a worker can take over.
+        self.on_connect_failure = on_connect_failure
+        self._conn: Connection | None = None
+        self._lock = threading.Lock()
+
+    def create_task(
+        self, task_create: TaskCreate, vault: str | None = None
+    ) -> TaskPublic:
+        """Send a create to the writer."""
+        payload = {"vault": vault, "task": task_create.model_dump()}
+        return TaskPublic.model_validate(self._call("create_task", payload))
+
+    def update_task(self, task_id: int, task_update: TaskUpdate) -> TaskPublic | None:
+        """Send an update (only the fields set) to the writer."""
+        payload = {
+            "task_id": task_id,
+            "task": task_update.model_dump(exclude_unset=True),
+        }
+        result = self._call("update_task", payload)
+        return TaskPublic.model_validate(result) if result else None
+
+    def delete_task(self, task_id: int) -> bool:
+        """Send a delete to the writer."""
+        return bool(self._call("delete_task", {"task_id": task_id}))
+
+    def start_resync(self, vault: str | None = None) -> JobPublic:
+        """Queue a resync on the writer's job runner."""
+        return JobPublic.model_validate(self._call("start_resync", {"vault": vault}))
+
+    def get_job(self, job_id: str) -> JobPublic | None:
+        """Look up a job on the writer's job runner."""
+        result = self._call("get_job", {"job_id": job_id})
+        return JobPublic.model_validate(result) if result else None
+
+    def cancel_job(self, job_id: str) -> JobPublic | None:
+        """Cancel a job on the writer's job runner."""
+        result = self._call("cancel_job", {"job_id": job_id})
+        return JobPublic.model_validate(result) if result else None
+
+    def close(self) -> None:
+        """Close the connection to the writer."""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _call(self, op: str, payload: dict[str, Any]) -> Any:
+        with self._lock:
+            try:
+                self._send((op, payload))
+            except OSError:
+                # The request never reached the writer, so resending is safe.
+                self._conn = None
+                try:
+                    self._send((op, payload))
+                except OSError as e:
+                    self._conn = None
+                    raise WriterError(f"Could not send {op} to writer") from e
+            try:
+                status, result = self._conn.recv()  # type: ignore[union-attr]
+            except (EOFError, OSError) as e:
+                # The write may or may not have been applied; don't retry it.
+                self._conn = None
+                raise WriterError(f"Lost connection to writer during {op}") from e
+        if status != "ok":
+            raise WriterError(result)
+        return result
+
+    def _send(self, message: tuple[str, dict[str, Any]]) -> None:
+        if self._conn is None:
+            self._conn = self._connect()
+        self._conn.send(message)
+
+    def _connect(self) -> Connection:
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, family="AF_UNIX", authkey=self.authkey)
+            except OSError as e:
+                if self.on_connect_failure is not None:
+                    self.on_connect_failure()
+                if time.monotonic() >= deadline:
+                    raise WriterError(f"Writer not reachable at {self.address}") from e
+                time.sleep(0.05)
+
+
+def acquire_writer_lock(lock_path: str) -> IO[str] | None:
+    """Try to become the writer; returns the held lock file or None.
+
+    The lock is an ``flock`` on ``lock_path``, so it is released by the OS if
+    the holder dies and another worker can then take over.
+    """
+    lock_file = open(lock_path, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return None
+    return lock_file
+
+
+_client: WriterClient | None = None
+_server: WriterServer | None = None
+_lock_file: IO[str] | None = None
+_election_lock = threading.Lock()
+
+
+def _elect() -> None:
+    """Start a writer in this process if no other process holds the lock."""
+    global _server, _lock_file
+    with _election_lock:
+        if _server is not None:
+            return
+        lock_file = acquire_writer_lock(WRITER_LOCK_PATH)
+        if lock_file is None:
+            return
+        _lock_file = lock_file
+        registry = get_shards()
+        registry.migrate()
+        _server = WriterServer(registry, WRITER_ADDRESS, WRITER_AUTHKEY)
+        _server.start()
+        logger.info(f"Worker {os.getpid()} elected as writer")
+
+
+def start_writer() -> None:
+    """Set up this worker's writer client when running in "ipc" mode."""
+    global _client
+    if WRITER_MODE != "ipc":
+        return
+    _elect()
+    _client = WriterClient(WRITER_ADDRESS, WRITER_AUTHKEY, on_connect_failure=_elect)
+
+
+def stop_writer() -> None:
+    """Close this worker's client, and its server if it was the writer."""
+    global _client, _server, _lock_file
+    if _client is not None:
+        _client.close()
+        _client = None
+    if _server is not None:
+        _server.close()
+        _server = None
+    if _lock_file is not None:
+        _lock_file.close()
+        _lock_file = None
+
+
+def get_task_writer() -> TaskWriter:
+    """Dependency returning the writer for the current deployment mode."""
+    if _client is not None:
+        return _client
+    return LocalTaskWriter(get_shards())
+
+
+def main() -> None:
+    """Run a dedicated writer process until interrupted."""
+    lock_file = acquire_writer_lock(WRITER_LOCK_PATH)
+    if lock_file is None:
+        raise SystemExit(f"Another writer already holds {WRITER_LOCK_PATH}")
+    registry = get_shards()
+    registry.migrate()
+    server = WriterServer(registry, WRITER_ADDRESS, WRITER_AUTHKEY)
+    jobs.start_jobs()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        jobs.stop_jobs()
+        server.close()
+        lock_file.close()
+
+
+if __name__ == "__main__":
+    main()
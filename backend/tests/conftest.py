@@ -0,0 +1,86 @@
+"""Fixtures shared by the test modules.
+
+Module-level caches (agenda buckets, tag bitmaps, query plans) and the job
+runner are replaced per test, because the code under test invalidates or
+uses the module-level instance directly.
+"""
+
+import pytest
+from sqlmodel import Session, SQLModel, create_engine
+
+from markado import agenda, jobs, query, shards, tags
+from markado.agenda import AgendaCache
+from markado.parse_cache import ParseCache
+from markado.query import QueryPlanCache
+from markado.shards import ShardRegistry
+from markado.tags import TagBitmaps
+
+
+@pytest.fixture
+def test_session():
+    # Setup in-memory SQLite database for testing
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        echo=False,
+    )
+
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+    SQLModel.metadata.drop_all(engine)
+
+
+@pytest.fixture
+def make_registry(tmp_path, monkeypatch):
+    """Build registries of vault shards named after directories in tmp_path."""
+    monkeypatch.setattr(shards, "SHARD_DIR", tmp_path / "shards")
+    registries = []
+
+    def _make_registry(*names: str) -> ShardRegistry:
+        registry = ShardRegistry()
+        for name in names:
+            registry.add_vault(tmp_path / name)
+        registries.append(registry)
+        return registry
+
+    yield _make_registry
+    for registry in registries:
+        registry.close()
+
+
+@pytest.fixture
+def registry(make_registry):
+    return make_registry("work", "personal")
+
+
+@pytest.fixture
+def agenda_cache(monkeypatch):
+    cache = AgendaCache()
+    monkeypatch.setattr(agenda, "cache", cache)
+    return cache
+
+
+@pytest.fixture
+def bitmaps(monkeypatch):
+    # A low threshold, so a tag becomes hot after its second lookup.
+    bitmaps = TagBitmaps(threshold=2)
+    monkeypatch.setattr(tags, "bitmaps", bitmaps)
+    return bitmaps
+
+
+@pytest.fixture
+def plans(monkeypatch):
+    plans = QueryPlanCache()
+    monkeypatch.setattr(query, "plans", plans)
+    return plans
+
+
+@pytest.fixture
+def runner(tmp_path, monkeypatch):
+    runner = jobs.JobRunner()
+    monkeypatch.setattr(jobs, "runner", runner)
+    monkeypatch.setattr(jobs, "_parse_cache", ParseCache(tmp_path / "cache", 2**20))
+    runner.start()
+    yield runner
+    runner.stop()
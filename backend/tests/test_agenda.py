@@ -0,0 +1,123 @@
+"""Tests for markado.agenda and the due-date range query behind it."""
+
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from markado import agenda, services
+from markado.models import Task, TaskCreate, TaskUpdate
+from markado.writer import LocalTaskWriter
+
+TODAY = date(2026, 3, 2)
+
+
+def day(offset: int) -> date:
+    return TODAY + timedelta(days=offset)
+
+
+@pytest.fixture
+def query_counter(monkeypatch):
+    calls = []
+    list_due_tasks = services.list_due_tasks
+
+    def counting(session, start, end):
+        calls.append((start, end))
+        return list_due_tasks(session, start, end)
+
+    monkeypatch.setattr(services, "list_due_tasks", counting)
+    return calls
+
+
+def test_list_due_tasks_range_and_order(test_session):
+    test_session.add_all(
+        [
+            Task(name="later", due=day(3)),
+            Task(name="first", due=day(0)),
+            Task(name="done", due=day(1), complete=True),
+            Task(name="outside", due=day(7)),
+            Task(name="undated"),
+            Task(name="past", due=day(-1)),
+        ]
+    )
+    test_session.commit()
+    tasks = services.list_due_tasks(test_session, day(0), day(7))
+    assert [t.name for t in tasks] == ["first", "later"]
+
+
+def test_list_due_tasks_uses_index_range_scan(test_session):
+    executed = []
+    engine = test_session.get_bind()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", capture)
+    services.list_due_tasks(test_session, day(0), day(7))
+    event.remove(engine, "before_cursor_execute", capture)
+
+    statement, parameters = executed[-1]
+    plan = test_session.connection().exec_driver_sql(
+        f"EXPLAIN QUERY PLAN {statement}", parameters
+    )
+    details = " ".join(row[-1] for row in plan.all())
+    assert "USING INDEX ix_task_complete_due" in details
+    assert "SCAN task" not in details
+    assert "TEMP B-TREE" not in details
+
+
+def test_agenda_buckets_by_day_across_shards(registry, agenda_cache):
+    writer = LocalTaskWriter(registry)
+    a = writer.create_task(TaskCreate(name="A", due=day(0)), "work")
+    b = writer.create_task(TaskCreate(name="B", due=day(0)), "personal")
+    writer.create_task(TaskCreate(name="C", due=day(2)), "personal")
+    writer.create_task(TaskCreate(name="D", due=day(5)), "work")
+
+    result = agenda.agenda(registry, 3, today=TODAY, agenda_cache=agenda_cache)
+    assert [entry.day for entry in result] == [day(0), day(1), day(2)]
+    assert [t.id for t in result[0].tasks] == sorted([a.id, b.id])
+    assert result[1].tasks == []
+    assert [t.name for t in result[2].tasks] == ["C"]
+
+
+def test_agenda_served_from_cache(registry, agenda_cache, query_counter):
+    LocalTaskWriter(registry).create_task(TaskCreate(name="A", due=day(1)), "work")
+    agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    assert len(query_counter) == 2  # one range scan per shard
+
+    again = agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    assert len(query_counter) == 2
+    assert [t.name for t in again[1].tasks] == ["A"]
+
+    # Only the days not yet cached are queried.
+    agenda.agenda(registry, 9, today=TODAY, agenda_cache=agenda_cache)
+    assert query_counter[2:] == [(day(7), day(9))] * 2
+
+
+def test_agenda_cache_rolls_over_at_day_boundary(registry, agenda_cache, query_counter):
+    agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    agenda.agenda(registry, 7, today=day(1), agenda_cache=agenda_cache)
+    assert len(query_counter) == 4
+
+
+def test_agenda_writes_invalidate_affected_days(registry, agenda_cache):
+    writer = LocalTaskWriter(registry)
+    task = writer.create_task(TaskCreate(name="Move me", due=day(1)), "work")
+    agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+
+    writer.update_task(task.id, TaskUpdate(name="Move me", due=day(4)))
+    result = agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    assert result[1].tasks == []
+    assert [t.name for t in result[4].tasks] == ["Move me"]
+
+    writer.update_task(task.id, TaskUpdate(name="Move me", complete=True, due=day(4)))
+    result = agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    assert result[4].tasks == []
+
+    created = writer.create_task(TaskCreate(name="New", due=day(2)), "personal")
+    result = agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    assert [t.id for t in result[2].tasks] == [created.id]
+
+    writer.delete_task(created.id)
+    result = agenda.agenda(registry, 7, today=TODAY, agenda_cache=agenda_cache)
+    assert result[2].tasks == []
@@ -1,6 +1,12 @@
+import time
+
+import pytest
 from fastapi.testclient import TestClient
 
+from markado import shards
 from markado.app import app
+from markado.shards import Shard, ShardRegistry, get_shards
+from markado.writer import LocalTaskWriter, WriterClient, get_task_writer
 
 
 def test_smoke():
@@ -27,3 +33,122 @@ def test_health():
 # response = client.get("/")
 # assert response.status_code == 200
 # assert response.json() == {"msg": "Hello World"}
+
+
+@pytest.fixture
+def vault_client(registry):
+    app.dependency_overrides[get_shards] = lambda: registry
+    app.dependency_overrides[get_task_writer] = lambda: LocalTaskWriter(registry)
+    yield client
+    app.dependency_overrides.clear()
+
+
+def test_tasks_across_vaults(vault_client):
+    work = vault_client.post("/tasks/?vault=work", json={"name": "A"}).json()
+    home = vault_client.post("/tasks/?vault=personal", json={"name": "B"}).json()
+    assert work["id"] != home["id"]
+
+    listed = vault_client.get("/tasks/").json()
+    assert [t["id"] for t in listed] == sorted([work["id"], home["id"]])
+    assert vault_client.get(f"/tasks/{home['id']}").json()["name"] == "B"
+    assert vault_client.get("/stats").json() == {"total": 2, "complete": 0}
+
+
+@pytest.mark.parametrize(
+    "params", ["offset=-5", "offset=10001", "limit=-1", "limit=101"]
+)
+def test_list_tasks_rejects_bad_paging(vault_client, params):
+    assert vault_client.get(f"/tasks/?{params}").status_code == 422
+
+
+def test_unreachable_writer_is_503(vault_client, tmp_path):
+    unreachable = WriterClient(str(tmp_path / "none.sock"), b"k", connect_timeout=0)
+    app.dependency_overrides[get_task_writer] = lambda: unreachable
+    response = vault_client.post("/tasks/", json={"name": "A"})
+    assert response.status_code == 503
+    assert "not reachable" in response.json()["detail"]
+
+
+def test_single_shard_pages_past_fanout_cap(tmp_path):
+    registry = ShardRegistry([Shard(shards.DEFAULT_SHARD, 0, tmp_path / "d.db")])
+    registry.default.migrate()
+    app.dependency_overrides[get_shards] = lambda: registry
+    try:
+        response = client.get("/tasks/?offset=20000")
+    finally:
+        app.dependency_overrides.clear()
+        registry.close()
+    assert response.status_code == 200 and response.json() == []
+
+
+def test_create_task_unknown_vault(vault_client):
+    response = vault_client.post("/tasks/?vault=nope", json={"name": "A"})
+    assert response.status_code == 404
+
+
+def test_list_tasks_by_tags(vault_client):
+    vault_client.post("/tasks/", json={"name": "A", "tags": ["work", "urgent"]})
+    vault_client.post("/tasks/", json={"name": "B", "tags": ["work", "waiting"]})
+    vault_client.post("/tasks/?vault=personal", json={"name": "C", "tags": ["urgent"]})
+
+    response = vault_client.get("/tasks/?tag=work&not_tag=waiting")
+    assert [(t["name"], t["tags"]) for t in response.json()] == [
+        ("A", ["urgent", "work"])
+    ]
+    response = vault_client.get("/tasks/?any_tag=urgent&any_tag=waiting")
+    assert sorted(t["name"] for t in response.json()) == ["A", "B", "C"]
+
+
+def test_query(vault_client):
+    vault_client.post("/tasks/", json={"name": "A", "tags": ["work"]})
+    vault_client.post("/tasks/?vault=personal", json={"name": "B", "priority": 1})
+
+    response = vault_client.get("/query", params={"q": "WHERE #work"})
+    assert [t["name"] for t in response.json()] == ["A"]
+    response = vault_client.get("/query", params={"q": "SORT priority DESC LIMIT 5"})
+    assert [t["name"] for t in response.json()] == ["B", "A"]
+
+    response = vault_client.get("/query", params={"q": "WHERE priority = 1"})
+    assert response.status_code == 400
+    assert "LIMIT" in response.json()["detail"]
+    response = vault_client.get(
+        "/query", params={"q": "WHERE priority = 1", "explain": True}
+    )
+    assert response.json()["rejected"] is True
+    response = vault_client.get(
+        "/query", params={"q": "WHERE priority = 99999999999999999999999 LIMIT 5"}
+    )
+    assert response.status_code == 400
+
+
+def test_resync_job(vault_client, runner, tmp_path):
+    (tmp_path / "work").mkdir()
+    (tmp_path / "work" / "note.md").write_text("- [ ] A #work\n- [x] B\n")
+
+    response = vault_client.post("/resync?vault=work")
+    assert response.status_code == 202
+    job = response.json()
+    assert job["status"] in ("queued", "running")
+    for _ in range(500):
+        job = vault_client.get(f"/jobs/{job['id']}").json()
+        if job["status"] not in ("queued", "running"):
+            break
+        time.sleep(0.01)
+    runner.stop()
+    assert job["status"] == "succeeded"
+    assert (job["files_total"], job["files_written"], job["tasks_written"]) == (1, 1, 2)
+    assert vault_client.get("/stats").json() == {"total": 2, "complete": 1}
+
+    assert vault_client.post("/resync?vault=nope").status_code == 404
+    assert vault_client.get("/jobs/nope").status_code == 404
+
+
+def test_resync_without_vault_dirs(tmp_path):
+    registry = ShardRegistry([Shard(shards.DEFAULT_SHARD, 0, tmp_path / "d.db")])
+    app.dependency_overrides[get_shards] = lambda: registry
+    try:
+        response = client.post("/resync")
+    finally:
+        app.dependency_overrides.clear()
+        registry.close()
+    assert response.status_code == 409
@@ -0,0 +1,206 @@
+"""Tests for markado.backfill, the chunked migration backfill helper."""
+
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlmodel import Session, SQLModel, col, func, select
+
+from markado.backfill import BackfillProgress, backfill_in_chunks
+from markado.database import BASE_DIR, make_engine
+from markado.models import Task
+
+ROWS = 1000
+UPDATE = "UPDATE task SET priority = id % 5 WHERE id BETWEEN :start AND :end"
+
+# A revision on top of head that uses the helper the way markado.backfill's
+# docstring tells migrations to.
+BACKFILL_REVISION = """
+from alembic import op
+
+from markado.backfill import backfill_in_chunks
+
+revision = "b4ckf111"
+down_revision = {head!r}
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Opens the migration's transaction, which autocommit_block() ends.
+    op.execute(
+        "INSERT INTO task (name, complete) WITH RECURSIVE n(i) AS "
+        "(SELECT 1 UNION ALL SELECT i + 1 FROM n WHERE i < 25) "
+        "SELECT 'T' || i, 0 FROM n"
+    )
+    with op.get_context().autocommit_block():
+        backfill_in_chunks(
+            op.get_bind(),
+            name="task.priority",
+            table="task",
+            update="UPDATE task SET priority = 1 WHERE id BETWEEN :start AND :end",
+            chunk_size=10,
+        )
+
+
+def downgrade() -> None:
+    pass
+"""
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "tasks.db"
+    engine = make_engine(path)
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all(Task(name=f"T{i}") for i in range(ROWS))
+        session.commit()
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def connection(db_file):
+    engine = make_engine(db_file)
+    with engine.connect() as conn:
+        yield conn.execution_options(isolation_level="AUTOCOMMIT")
+    engine.dispose()
+
+
+def count_backfilled(db_file) -> int:
+    engine = make_engine(db_file, read_only=True)
+    with Session(engine) as session:
+        statement = select(func.count()).where(col(Task.priority).is_not(None))
+        count = session.exec(statement).one()
+    engine.dispose()
+    return count
+
+
+def test_backfill_updates_every_row_in_chunks(connection, db_file):
+    seen: list[int] = []
+    result = backfill_in_chunks(
+        connection,
+        name="priority",
+        table="task",
+        update=UPDATE,
+        chunk_size=100,
+        progress=lambda p: seen.append(p.last_id),
+    )
+    assert seen == list(range(100, ROWS + 1, 100))
+    assert result.fraction == 1.0
+    assert count_backfilled(db_file) == ROWS
+
+
+def test_backfill_commits_between_chunks_and_serves_reads(connection, db_file):
+    # A separate reader sees each chunk as soon as it is committed.
+    counts: list[int] = []
+    backfill_in_chunks(
+        connection,
+        name="priority",
+        table="task",
+        update=UPDATE,
+        chunk_size=250,
+        progress=lambda p: counts.append(count_backfilled(db_file)),
+    )
+    assert counts == [250, 500, 750, 1000]
+
+
+def test_backfill_resumes_after_interruption(connection, db_file):
+    class Interrupted(Exception):
+        pass
+
+    def stop_after_three(progress: BackfillProgress) -> None:
+        if progress.chunks == 3:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        backfill_in_chunks(
+            connection,
+            name="priority",
+            table="task",
+            update=UPDATE,
+            chunk_size=100,
+            progress=stop_after_three,
+        )
+    assert count_backfilled(db_file) == 300
+
+    seen: list[int] = []
+    backfill_in_chunks(
+        connection,
+        name="priority",
+        table="task",
+        update=UPDATE,
+        chunk_size=100,
+        progress=lambda p: seen.append(p.last_id),
+    )
+    assert seen[0] == 400
+    assert count_backfilled(db_file) == ROWS
+
+
+def test_completed_backfill_is_not_rerun(connection):
+    backfill_in_chunks(connection, name="priority", table="task", update=UPDATE)
+    seen: list[int] = []
+    backfill_in_chunks(
+        connection,
+        name="priority",
+        table="task",
+        update=UPDATE,
+        progress=lambda p: seen.append(p.last_id),
+    )
+    assert seen == []
+
+
+def test_failed_chunk_is_rolled_back(connection, db_file):
+    with pytest.raises(Exception):
+        backfill_in_chunks(
+            connection,
+            name="broken",
+            table="task",
+            update="UPDATE task SET priority = 1 WHERE id BETWEEN :start AND :end "
+            "AND no_such_column = 1",
+        )
+    assert count_backfilled(db_file) == 0
+
+
+def test_backfill_inside_alembic_migration(tmp_path):
+    config = Config()
+    config.set_main_option("script_location", str(BASE_DIR / "migrations"))
+    head = ScriptDirectory.from_config(config).get_current_head()
+    versions = tmp_path / "versions"
+    versions.mkdir()
+    (versions / "b4ckf111_backfill.py").write_text(BACKFILL_REVISION.format(head=head))
+    config.set_main_option("path_separator", "os")
+    config.set_main_option(
+        "version_locations",
+        os.pathsep.join([str(BASE_DIR / "migrations" / "versions"), str(versions)]),
+    )
+    engine = make_engine(tmp_path / "tasks.db")
+    with engine.connect() as connection:
+        config.attributes["connection"] = connection
+        command.upgrade(config, "heads")
+    with engine.connect() as connection:
+        progress = connection.exec_driver_sql(
+            "SELECT last_id, done FROM backfill_progress"
+        ).all()
+        backfilled = connection.exec_driver_sql(
+            "SELECT COUNT(*) FROM task WHERE priority = 1"
+        ).scalar()
+        version = connection.exec_driver_sql(
+            "SELECT version_num FROM alembic_version"
+        ).scalar()
+    engine.dispose()
+    assert progress == [(25, 1)]
+    assert backfilled == 25
+    assert version == "b4ckf111"
+
+
+def test_progress_eta():
+    progress = BackfillProgress(
+        "x", last_id=300, max_id=1000, elapsed=2.0, resumed_from=100
+    )
+    assert progress.fraction == 0.3
+    assert progress.eta == pytest.approx(7.0)
+    assert BackfillProgress("x", last_id=0, max_id=1000).eta is None
@@ -0,0 +1,59 @@
+"""Tests for markado.indexer, which loads parsed vault files into a shard."""
+
+from datetime import date
+
+import pytest
+from sqlmodel import select
+
+from markado import services
+from markado.indexer import index_vault
+from markado.models import Project, Task, TaskCreate
+from markado.tags import TagFilter
+
+NOTE = """---
+project: Launch
+tags: [work]
+---
+
+- [ ] Draft post #urgent 📅 2026-03-04
+- [x] Book venue ⏫
+- [ ] Fix date [due:: someday]
+"""
+
+
+@pytest.fixture
+def vault(tmp_path):
+    vault = tmp_path / "vault"
+    (vault / "notes").mkdir(parents=True)
+    (vault / "notes" / "launch.md").write_text(NOTE, encoding="utf-8")
+    (vault / "inbox.md").write_text("- [ ] Call Sam #home\n", encoding="utf-8")
+    return vault
+
+
+def test_index_vault(test_session, vault):
+    assert index_vault(test_session, vault, "s") == 4
+    tasks = test_session.exec(select(Task).order_by(Task.file_path, Task.line_number))
+    rows = [
+        (t.file_path, t.line_number, t.name, t.due, [tag.name for tag in t.tags])
+        for t in tasks
+    ]
+    assert rows == [
+        ("inbox.md", 1, "Call Sam", None, ["home"]),
+        ("notes/launch.md", 6, "Draft post", date(2026, 3, 4), ["urgent", "work"]),
+        ("notes/launch.md", 7, "Book venue", None, ["work"]),
+        ("notes/launch.md", 8, "Fix date", None, ["work"]),
+    ]
+    project = test_session.exec(select(Project)).one()
+    assert project.name == "Launch" and len(project.tasks) == 3
+
+
+def test_reindex_replaces_changed_and_removed_files(test_session, vault):
+    services.create_task(test_session, TaskCreate(name="From the API", tags=["work"]))
+    index_vault(test_session, vault, "s")
+    (vault / "inbox.md").unlink()
+    (vault / "notes" / "launch.md").write_text("- [ ] Only task #work\n")
+    index_vault(test_session, vault, "s")
+
+    tagged = services.list_tasks(test_session, tag_filter=TagFilter(all_of=["work"]))
+    assert [t.name for t in tagged] == ["From the API", "Only task"]
+    assert services.task_stats(test_session).total == 2
@@ -0,0 +1,135 @@
+"""Tests for markado.jobs, the background job runner and vault resync."""
+
+import threading
+import time
+
+import pytest
+
+from markado import jobs, shards
+from markado.jobs import CANCELLED, FAILED, SUCCEEDED, Job, Throttle
+from markado.models import TaskCreate
+from markado.shards import Shard, ShardRegistry
+from markado.writer import LocalTaskWriter
+
+FILES = 20
+
+
+@pytest.fixture
+def registry(registry):
+    for shard in registry:
+        shard.vault_dir.mkdir()
+        for n in range(FILES):
+            lines = [f"- [ ] {shard.name} task {n}.{t} #t{t}" for t in range(3)]
+            text = "\n".join(lines)
+            (shard.vault_dir / f"note{n}.md").write_text(text, encoding="utf-8")
+    return registry
+
+
+def wait_for(job: Job, timeout: float = 10.0) -> Job:
+    deadline = time.monotonic() + timeout
+    while job.status in jobs.ACTIVE:
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        time.sleep(0.01)
+    return job
+
+
+def blocking_work(started: threading.Event, release: threading.Event):
+    def work(job: Job) -> None:
+        started.set()
+        while not release.is_set():
+            job.wait(0.01)
+
+    return work
+
+
+def test_resync_indexes_vaults_and_reports_progress(registry, runner):
+    job = wait_for(jobs.start_resync(registry))
+    assert job.status == SUCCEEDED
+    public = job.public()
+    assert public.files_total == public.files_scanned == 2 * FILES
+    assert public.files_parsed == public.files_written == 2 * FILES
+    assert public.tasks_written == 2 * FILES * 3
+    assert public.files_per_second and public.eta_seconds is None
+    assert shards.task_stats(registry).total == 2 * FILES * 3
+
+
+def test_resync_keeps_api_tasks_and_drops_deleted_files(registry, runner):
+    writer = LocalTaskWriter(registry)
+    writer.create_task(TaskCreate(name="From the API"), "work")
+    wait_for(jobs.start_resync(registry, "work"))
+    (registry.get("work").vault_dir / "note0.md").unlink()
+    job = wait_for(jobs.start_resync(registry, "work"))
+    assert job.files_total == FILES - 1
+    assert shards.task_stats(registry).total == 1 + (FILES - 1) * 3
+
+
+def test_duplicate_requests_merge_into_active_job(runner):
+    started, release = threading.Event(), threading.Event()
+    everything = runner.submit("resync", None, blocking_work(started, release))
+    assert started.wait(5)
+    assert runner.submit("resync", None, lambda job: None) is everything
+    # A full resync also covers a single vault.
+    assert runner.submit("resync", "work", lambda job: None) is everything
+    release.set()
+    assert wait_for(everything).status == SUCCEEDED
+
+    after = runner.submit("resync", None, lambda job: None)
+    assert after is not everything
+    wait_for(after)
+
+
+def test_cancel_running_and_queued_jobs(runner):
+    started, release = threading.Event(), threading.Event()
+    running = runner.submit("resync", "work", blocking_work(started, release))
+    queued = runner.submit("resync", "personal", lambda job: None)
+    assert started.wait(5)
+
+    assert runner.cancel(queued.id).status == CANCELLED
+    runner.cancel(running.id)
+    assert wait_for(running).status == CANCELLED
+    # A cancelled job is no longer merged with.
+    again = runner.submit("resync", "work", lambda job: None)
+    assert again is not running
+    assert wait_for(again).status == SUCCEEDED
+
+
+def test_cancelled_resync_keeps_written_files(registry, runner, monkeypatch):
+    # Files are ~80 bytes, so at 200 bytes/s the job writes a couple of
+    # files at once and then crawls.
+    monkeypatch.setattr(
+        jobs, "Throttle", lambda: Throttle(cpu_fraction=1, bytes_per_second=200)
+    )
+    job = jobs.start_resync(registry, "work")
+    deadline = time.monotonic() + 5
+    while job.files_written == 0:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    runner.cancel(job.id)
+    assert wait_for(job).status == CANCELLED
+    assert 0 < job.files_written < FILES
+    assert shards.task_stats(registry).total == job.tasks_written
+
+
+def test_failed_job_reports_error(runner):
+    def fail(job: Job) -> None:
+        raise RuntimeError("disk on fire")
+
+    job = wait_for(runner.submit("resync", None, fail))
+    assert job.status == FAILED
+    assert job.error == "RuntimeError: disk on fire"
+
+
+def test_resync_without_vault_dirs_fails(tmp_path, runner):
+    default = Shard(shards.DEFAULT_SHARD, 0, tmp_path / "default.db")
+    job = wait_for(jobs.start_resync(ShardRegistry([default])))
+    default.close()
+    assert job.status == FAILED
+    assert job.error and "No vault directory" in job.error
+
+
+def test_throttle_limits_cpu_share():
+    job = Job("resync")
+    throttle = Throttle(cpu_fraction=0.5, bytes_per_second=0)
+    started = time.monotonic()
+    throttle.after_work(job, 0.05)
+    assert time.monotonic() - started >= 0.05
@@ -0,0 +1,129 @@
+"""Tests for markado.parse_cache, the on-disk cache of parsed markdown."""
+
+import os
+from pathlib import Path
+
+import pytest
+
+from markado import parse_cache, parser
+from markado.parse_cache import ParseCache, decode, encode, parser_key
+from markado.parser import parse_markdown, parse_vault
+
+NOTE = b"---\ntags: [a]\n---\n- [ ] First #x\n- [x] Second [priority:: 1]\n"
+
+
+def test_encode_decode_round_trip():
+    parsed = parse_markdown(NOTE.decode())
+    assert decode(encode(parsed)) == parsed
+
+
+def test_decode_rejects_other_parser_version(monkeypatch):
+    data = encode(parse_markdown(NOTE.decode()))
+    monkeypatch.setattr(parse_cache, "PARSER_KEY", bytes(8))
+    with pytest.raises(ValueError):
+        decode(data)
+
+
+def test_parse_hits_after_miss(tmp_path):
+    cache = ParseCache(tmp_path)
+    first = cache.parse(NOTE)
+    second = cache.parse(NOTE)
+    assert first == second
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_changed_content_misses(tmp_path):
+    cache = ParseCache(tmp_path)
+    cache.parse(NOTE)
+    cache.parse(NOTE + b"- [ ] Third\n")
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_corrupt_entry_is_a_miss(tmp_path):
+    cache = ParseCache(tmp_path)
+    cache.parse(NOTE)
+    (entry,) = cache.version_dir.glob("*/*.bin")
+    entry.write_bytes(b"garbage")
+    assert len(cache.parse(NOTE).tasks) == 2
+    assert cache.misses == 2
+
+
+def test_parser_version_change_drops_old_entries(tmp_path, monkeypatch):
+    ParseCache(tmp_path).parse(NOTE)
+    monkeypatch.setattr(parse_cache, "PARSER_KEY", bytes(8))
+    cache = ParseCache(tmp_path)
+    assert [p.name for p in tmp_path.iterdir()] == [cache.version_dir.name]
+    cache.parse(NOTE)
+    assert cache.misses == 1
+
+
+def test_parser_key_follows_parser_source(tmp_path):
+    source = tmp_path / "parser.py"
+    source.write_bytes(Path(parser.__file__).read_bytes())
+    assert parser_key(source) == parse_cache.PARSER_KEY
+    with source.open("a") as f:
+        f.write("# a forgotten version bump\n")
+    assert parser_key(source) != parse_cache.PARSER_KEY
+
+
+def test_only_version_directories_are_dropped(tmp_path):
+    (tmp_path / "important_stuff").mkdir()
+    (tmp_path / "important_stuff" / "notes.txt").write_text("keep me")
+    (tmp_path / "v0-f1").mkdir()
+    (tmp_path / "v0123456789abcdef").mkdir()
+    ParseCache(tmp_path)
+    assert (tmp_path / "important_stuff" / "notes.txt").exists()
+    assert not (tmp_path / "v0-f1").exists()
+    assert not (tmp_path / "v0123456789abcdef").exists()
+
+
+def test_entry_evicted_before_touch_is_a_miss(tmp_path, monkeypatch):
+    cache = ParseCache(tmp_path)
+    cache.parse(NOTE)
+
+    def evicted(path):
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(parse_cache.os, "utime", evicted)
+    assert len(cache.parse(NOTE).tasks) == 2
+    assert (cache.hits, cache.misses) == (0, 2)
+
+
+def test_eviction_keeps_cache_under_limit(tmp_path):
+    entry_size = len(encode(parse_markdown("- [ ] Task 0")))
+    cache = ParseCache(tmp_path, max_bytes=entry_size * 5)
+    for i in range(20):
+        cache.parse(f"- [ ] Task {i}".encode())
+    assert cache.size <= cache.max_bytes
+    assert cache.size == sum(p.stat().st_size for p in cache._entries())
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ParseCache(tmp_path, max_bytes=10**6)
+    old, recent = b"- [ ] old", b"- [ ] recent"
+    cache.parse(old)
+    cache.parse(recent)
+    for path in cache._entries():
+        os.utime(path, (0, 0))
+    cache.parse(recent)  # touches the entry
+    cache.max_bytes = cache.size - 1
+    cache.evict()
+    cache.parse(recent)
+    assert cache.hits == 2
+
+
+def test_warm_vault_parse_only_reads_cache(tmp_path):
+    vault = tmp_path / "vault"
+    vault.mkdir()
+    for i in range(5):
+        (vault / f"note{i}.md").write_bytes(NOTE)
+        (vault / f"other{i}.md").write_text(f"- [ ] Unique {i}")
+    cache = ParseCache(tmp_path / "cache")
+
+    cold = list(parse_vault(vault, cache))
+    cold_misses = cache.misses
+    warm = list(parse_vault(vault, cache))
+
+    assert warm == cold
+    assert cold_misses == 6
+    assert cache.misses == cold_misses
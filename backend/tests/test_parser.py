@@ -0,0 +1,80 @@
+"""Tests for markado.parser, the markdown task parser."""
+
+import pytest
+
+from markado.parser import parse_markdown, parse_task_line, parse_vault
+
+NOTE = """---
+project: Selfbuild
+tags: [home, build]
+aliases:
+  - Eco homes
+---
+# Plans
+
+- [ ] Look at eco homes #home 📅 2026-03-01 ⏫
+- [x] Call the architect [priority:: 2] due:: 2026-02-10
+Some prose, not a task.
+  * [ ] Nested task #build/roof
+"""
+
+
+def test_parse_markdown_frontmatter():
+    parsed = parse_markdown(NOTE)
+    assert parsed.frontmatter == {
+        "project": "Selfbuild",
+        "tags": ["home", "build"],
+        "aliases": ["Eco homes"],
+    }
+
+
+def test_parse_markdown_tasks():
+    tasks = parse_markdown(NOTE).tasks
+    assert [t.line_number for t in tasks] == [9, 10, 12]
+
+    assert tasks[0].name == "Look at eco homes"
+    assert tasks[0].complete is False
+    assert tasks[0].due == "2026-03-01"
+    assert tasks[0].priority == 2
+    assert tasks[0].tags == ["home"]
+
+    assert tasks[1].name == "Call the architect"
+    assert tasks[1].complete is True
+    assert tasks[1].due == "2026-02-10"
+    assert tasks[1].priority == 2
+
+    assert tasks[2].tags == ["build/roof"]
+
+
+def test_parse_markdown_unclosed_frontmatter_is_body():
+    parsed = parse_markdown("---\nproject: x\n- [ ] Task")
+    assert parsed.frontmatter == {}
+    assert [t.name for t in parsed.tasks] == ["Task"]
+
+
+@pytest.mark.parametrize(
+    "line",
+    ["- [] not a task", "just text", "-[ ] missing space", "# heading"],
+)
+def test_parse_task_line_rejects_non_tasks(line):
+    assert parse_task_line(line, 1) is None
+
+
+@pytest.mark.parametrize(
+    ("value", "expected"),
+    [("3", 3), ("²", None), ("٣", None), ("99999999999999999999", None), ("-1", None)],
+)
+def test_parse_task_line_priority_bounds(value, expected):
+    task = parse_task_line(f"- [ ] a [priority:: {value}]", 1)
+    assert task is not None and task.priority == expected
+
+
+def test_parse_vault_walks_markdown_files(tmp_path):
+    (tmp_path / "work").mkdir()
+    (tmp_path / "work" / "a.md").write_text("- [ ] A")
+    (tmp_path / "b.md").write_text("- [x] B")
+    (tmp_path / "c.txt").write_text("- [ ] ignored")
+
+    results = {str(path): parsed for path, parsed in parse_vault(tmp_path)}
+    assert sorted(results) == ["b.md", "work/a.md"]
+    assert results["b.md"].tasks[0].complete is True
@@ -0,0 +1,117 @@
+"""Tests for markado.query, the Dataview-style query language."""
+
+from datetime import date, timedelta
+
+import pytest
+
+from markado import query
+from markado.indexer import get_or_create_project
+from markado.models import TaskCreate
+from markado.query import QueryError
+from markado.writer import LocalTaskWriter
+
+TODAY = date.today()
+
+
+@pytest.fixture
+def registry(registry):
+    writer = LocalTaskWriter(registry)
+    for vault in ("work", "personal"):
+        with registry.get(vault).session() as session:
+            project = get_or_create_project(session, f"{vault} project")
+            session.commit()
+            project_id = project.id
+        tasks = [
+            TaskCreate(name=f"{vault} overdue", due=TODAY - timedelta(days=1)),
+            TaskCreate(name=f"{vault} urgent", priority=1, tags=["urgent", vault]),
+            TaskCreate(
+                name=f"{vault} done",
+                complete=True,
+                due=TODAY,
+                priority=3,
+                project_id=project_id,
+            ),
+            TaskCreate(name=f"{vault} later", due=TODAY + timedelta(days=3)),
+        ]
+        for task in tasks:
+            writer.create_task(task, vault)
+    return registry
+
+
+def run(registry, text: str) -> list[str]:
+    return [task.name for task in query.run_query(registry, text)]
+
+
+@pytest.mark.parametrize(
+    ("text", "expected"),
+    [
+        (
+            "WHERE !complete AND due < today",
+            ["personal overdue", "work overdue"],
+        ),
+        (
+            "WHERE !complete AND due >= today SORT due DESC",
+            ["personal later", "work later"],
+        ),
+        ("WHERE #urgent AND #personal", ["personal urgent"]),
+        ('WHERE #urgent AND NOT tags = "work"', ["personal urgent"]),
+        (
+            'WHERE project = "work project" OR priority = 1 SORT priority LIMIT 5',
+            ["personal urgent", "work urgent", "work done"],
+        ),
+        (
+            "WHERE due = null AND complete = false LIMIT 10",
+            ["personal urgent", "work urgent"],
+        ),
+        ("SORT complete DESC, project LIMIT 2", ["personal done", "work done"]),
+    ],
+)
+def test_queries(registry, plans, text, expected):
+    assert run(registry, text) == expected
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "WHERE size > 2",
+        'WHERE priority = "high"',
+        "WHERE due < tomorrow",
+        "WHERE (#work",
+        "SORT tags LIMIT 5",
+        "LIMIT 5000",
+        "WHERE complete ~ 1",
+        "WHERE priority = 99999999999999999999999 LIMIT 5",
+    ],
+)
+def test_syntax_errors(registry, plans, text):
+    with pytest.raises(QueryError):
+        query.run_query(registry, text)
+
+
+def test_unbounded_full_scan_is_rejected(registry, plans):
+    with pytest.raises(QueryError, match="scan every task"):
+        query.run_query(registry, "WHERE priority <= 2")
+    assert run(registry, "WHERE priority <= 2 LIMIT 10") == [
+        "personal urgent",
+        "work urgent",
+    ]
+    # A due range alone can still use ix_task_complete_due.
+    assert len(run(registry, "WHERE due >= today")) == 4
+
+
+def test_plans_are_cached_by_normalised_text(registry, plans):
+    run(registry, "WHERE #Urgent AND !complete")
+    run(registry, "  where   #urgent and ! COMPLETE ")
+    assert (plans.hits, plans.misses) == (1, 1)
+
+
+def test_explain(registry, plans):
+    explained = query.explain(registry, "where !complete and due < today")
+    assert explained.query == "WHERE ! complete AND due < TODAY"
+    assert any("ix_task_complete_due" in step for step in explained.plan)
+    # Values are bound parameters; today is only resolved when run.
+    assert "?" in explained.sql and TODAY.isoformat() not in explained.sql
+    assert not explained.full_scan and not explained.rejected
+
+    explained = query.explain(registry, "WHERE priority = 1")
+    assert explained.full_scan and explained.rejected
@@ -1,12 +1,11 @@
 """Tests for markado.services using an in-memory SQLite database.
 
 This module provides fixtures and tests for the markado.services
-functions, including a Session fixture that sets up an in-memory SQLite
-database for isolated testing.
+functions; the in-memory Session fixture lives in conftest.py.
 """
 
 import pytest
-from sqlmodel import Session, SQLModel, create_engine, select
+from sqlmodel import Session, select
 
 from markado.models import Task, TaskCreate, TaskUpdate
 from markado.services import create_task, delete_task, get_task, list_tasks, update_task
@@ -14,21 +13,6 @@ from markado.services import create_task, delete_task, get_task, list_tasks, upd
 ## list-tasks tests
 
 
-@pytest.fixture
-def test_session():
-    # Setup in-memory SQLite database for testing
-    engine = create_engine(
-        "sqlite://",
-        connect_args={"check_same_thread": False},
-        echo=False,
-    )
-
-    SQLModel.metadata.create_all(engine)
-    with Session(engine) as session:
-        yield session
-    SQLModel.metadata.drop_all(engine)
-
-
 @pytest.fixture
 def session_with_tasks(test_session: Session):
     tasks = [
@@ -0,0 +1,138 @@
+"""Tests for markado.shards, the per-vault SQLite index shards."""
+
+import pytest
+
+from markado import shards
+from markado.database import make_engine
+from markado.models import TaskCreate, TaskUpdate
+from markado.shards import (
+    Shard,
+    ShardRegistry,
+    decode_task_id,
+    encode_task_id,
+    shard_number,
+)
+from markado.writer import LocalTaskWriter
+
+
+@pytest.fixture
+def registry(make_registry):
+    return make_registry("work", "personal", "archive")
+
+
+@pytest.fixture
+def writer(registry):
+    return LocalTaskWriter(registry)
+
+
+def test_task_id_round_trip():
+    number = shard_number("work")
+    task_id = encode_task_id(number, 12345)
+    assert decode_task_id(task_id) == (number, 12345)
+    assert task_id < 2**53
+
+
+def test_shard_number_is_stable_and_never_default():
+    assert shard_number("work") == shard_number("work")
+    assert all(shard_number(f"vault{i}") != 0 for i in range(1000))
+
+
+def test_create_goes_to_named_vault(registry, writer):
+    task = writer.create_task(TaskCreate(name="Report"), "personal")
+    shard, local_id = registry.for_task_id(task.id)
+    assert shard.name == "personal"
+    assert local_id == 1
+
+
+def test_create_defaults_to_first_vault(registry, writer):
+    task = writer.create_task(TaskCreate(name="Inbox"))
+    assert registry.for_task_id(task.id)[0].name == "work"
+
+
+def test_update_and_delete_route_by_id(registry, writer):
+    writer.create_task(TaskCreate(name="Work task"), "work")
+    task = writer.create_task(TaskCreate(name="Archive task"), "archive")
+
+    updated = writer.update_task(task.id, TaskUpdate(name="Renamed"))
+    assert updated is not None and updated.id == task.id
+    assert shards.get_task(registry, task.id).name == "Renamed"
+
+    assert writer.delete_task(task.id) is True
+    assert shards.get_task(registry, task.id) is None
+    assert writer.delete_task(encode_task_id(4000, 1)) is False
+
+
+def test_list_tasks_merges_shards_in_id_order(registry, writer):
+    for i in range(5):
+        for vault in ("archive", "work", "personal"):
+            writer.create_task(TaskCreate(name=f"{vault}-{i}"), vault)
+
+    tasks = shards.list_tasks(registry, limit=100)
+    ids = [task.id for task in tasks]
+    assert len(tasks) == 15
+    assert ids == sorted(ids)
+
+    page = shards.list_tasks(registry, offset=4, limit=6)
+    assert [task.id for task in page] == ids[4:10]
+
+
+def test_list_tasks_search_across_shards(registry, writer):
+    writer.create_task(TaskCreate(name="Buy milk"), "personal")
+    writer.create_task(TaskCreate(name="Milk report"), "work")
+    writer.create_task(TaskCreate(name="Tidy house"), "archive")
+
+    names = {task.name for task in shards.list_tasks(registry, q="ilk")}
+    assert names == {"Buy milk", "Milk report"}
+
+
+def test_task_stats_sum_shards(registry, writer):
+    writer.create_task(TaskCreate(name="A", complete=True), "work")
+    writer.create_task(TaskCreate(name="B"), "personal")
+    writer.create_task(TaskCreate(name="C"), "archive")
+
+    stats = shards.task_stats(registry)
+    assert (stats.total, stats.complete) == (3, 1)
+
+
+def test_adding_and_removing_vaults_leaves_other_shards_alone(
+    registry, writer, tmp_path
+):
+    writer.create_task(TaskCreate(name="Keep me"), "work")
+    work_file = registry.get("work").path
+    before = work_file.stat()
+
+    registry.add_vault(tmp_path / "vaults" / "side-project")
+    registry.remove("archive")
+
+    after = work_file.stat()
+    assert (after.st_mtime_ns, after.st_size) == (before.st_mtime_ns, before.st_size)
+    assert "archive" not in registry
+    assert [t.name for t in shards.list_tasks(registry)] == ["Keep me"]
+
+
+def test_default_registry_keeps_the_default_shard(tmp_path, monkeypatch):
+    # Tasks created before VAULT_DIRS was set live in the DATABASE_PATH shard.
+    default_db = tmp_path / "default.db"
+    before = ShardRegistry([Shard(shards.DEFAULT_SHARD, 0, default_db)])
+    before.default.migrate()
+    LocalTaskWriter(before).create_task(TaskCreate(name="Old task"))
+    before.close()
+
+    monkeypatch.setattr(shards, "engine", make_engine(default_db))
+    monkeypatch.setattr(shards, "read_engine", make_engine(default_db, read_only=True))
+    monkeypatch.setattr(shards, "SHARD_DIR", tmp_path / "shards")
+    monkeypatch.setattr(shards, "VAULT_DIRS", str(tmp_path / "work"))
+    registry = shards.default_registry()
+    try:
+        assert [shard.name for shard in registry] == [shards.DEFAULT_SHARD, "work"]
+        LocalTaskWriter(registry).create_task(TaskCreate(name="New"), "work")
+        names = [task.name for task in shards.list_tasks(registry)]
+        assert names == ["Old task", "New"]
+        assert shards.task_stats(registry).total == 2
+    finally:
+        registry.close()
+
+
+def test_duplicate_vault_name_rejected(registry, tmp_path):
+    with pytest.raises(ValueError):
+        registry.add_vault(tmp_path / "elsewhere" / "work")
@@ -0,0 +1,168 @@
+"""Tests for markado.tags, the tag index and multi-tag filtering."""
+
+import pytest
+from sqlmodel import select
+
+from markado import services, shards, tags
+from markado.models import Task, TaskCreate, TaskUpdate
+from markado.tags import TagBitmaps, TagFilter, bits_from_ids, iter_bits
+from markado.writer import LocalTaskWriter
+
+TASKS = {
+    "Write report": ["work", "urgent"],
+    "Chase invoice": ["work", "urgent", "waiting"],
+    "Team lunch": ["work"],
+    "Buy milk": ["home", "urgent"],
+    "Read book": [],
+}
+
+
+@pytest.fixture
+def test_session(test_session):
+    for name, task_tags in TASKS.items():
+        services.create_task(test_session, TaskCreate(name=name, tags=task_tags))
+    return test_session
+
+
+def names(tasks) -> list[str]:
+    return [task.name for task in tasks]
+
+
+@pytest.mark.parametrize(
+    ("tag_filter", "expected"),
+    [
+        (TagFilter(all_of=["work"]), ["Write report", "Chase invoice", "Team lunch"]),
+        (TagFilter(all_of=["work", "urgent"]), ["Write report", "Chase invoice"]),
+        (
+            TagFilter(all_of=["work", "urgent"], none_of=["waiting"]),
+            ["Write report"],
+        ),
+        (
+            TagFilter(any_of=["home", "waiting"]),
+            ["Chase invoice", "Buy milk"],
+        ),
+        (TagFilter(none_of=["work", "home"]), ["Read book"]),
+        (TagFilter(all_of=["#Work", "URGENT"]), ["Write report", "Chase invoice"]),
+        (TagFilter(all_of=["work", "unknown"]), []),
+        (TagFilter(any_of=["unknown"]), []),
+        (TagFilter(none_of=["unknown"]), list(TASKS)),
+    ],
+)
+def test_tag_filter_sql(test_session, tag_filter, expected):
+    tasks = services.list_tasks(test_session, tag_filter=tag_filter)
+    assert names(tasks) == expected
+
+
+def test_tag_filter_uses_task_tag_indexes(test_session):
+    tag_filter = TagFilter(all_of=["work", "urgent"], none_of=["waiting"])
+    statement = select(Task).where(tags.tag_filter_clause(test_session, tag_filter))
+    compiled = statement.compile(compile_kwargs={"literal_binds": True})
+    plan = test_session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}")
+    details = " ".join(row[3] for row in plan)
+    assert "SCAN task_tag" not in details
+    assert "USING PRIMARY KEY" in details or "USING COVERING INDEX" in details
+
+
+def test_tags_are_normalised_and_shared(test_session):
+    a = services.create_task(test_session, TaskCreate(name="A", tags=["#Work"]))
+    assert [tag.name for tag in a.tags] == ["work"]
+    assert len(tags.tag_ids(test_session, ["work", "urgent", "home"])) == 3
+
+
+def test_update_replaces_tags_only_when_given(test_session):
+    task = services.create_task(test_session, TaskCreate(name="A", tags=["x"]))
+    task = services.update_task(test_session, task.id, TaskUpdate(name="B"))
+    assert [tag.name for tag in task.tags] == ["x"]
+    task = services.update_task(test_session, task.id, TaskUpdate(tags=["y", "z"]))
+    assert [tag.name for tag in task.tags] == ["y", "z"]
+
+
+def test_bits_round_trip():
+    ids = [0, 1, 7, 8, 63, 64, 1000, 123_456]
+    assert list(iter_bits(bits_from_ids(ids))) == ids
+    assert list(iter_bits(0)) == []
+
+
+def test_bitmaps_serve_hot_tags(test_session):
+    bitmaps = TagBitmaps(threshold=2)
+    tag_filter = TagFilter(all_of=["work", "urgent"], none_of=["waiting"])
+    # Cold until each tag has been asked for twice.
+    assert bitmaps.task_ids(test_session, "s", tag_filter, 0, 10) is None
+    assert bitmaps.task_ids(test_session, "s", tag_filter, 0, 10) == [1]
+    any_filter = TagFilter(any_of=["urgent", "waiting"])
+    assert bitmaps.task_ids(test_session, "s", any_filter, 0, 10) == [1, 2, 4]
+    assert bitmaps.task_ids(test_session, "s", any_filter, 1, 1) == [2]
+
+
+def test_bitmaps_never_answer_pure_exclusion(test_session):
+    bitmaps = TagBitmaps(threshold=1)
+    tag_filter = TagFilter(none_of=["work"])
+    assert bitmaps.task_ids(test_session, "s", tag_filter, 0, 10) is None
+
+
+def test_bitmaps_only_count_known_tags(test_session):
+    bitmaps = TagBitmaps(threshold=2)
+    for n in range(50):
+        tag_filter = TagFilter(all_of=["work", f"made-up-{n}"])
+        assert bitmaps.task_ids(test_session, "s", tag_filter, 0, 10) in (None, [])
+    assert set(bitmaps._hits) == {("s", "work")}
+
+
+def test_bitmap_hit_counts_decay(test_session, monkeypatch):
+    monkeypatch.setattr(tags, "MAX_COUNTED_TAGS", 2)
+    bitmaps = TagBitmaps(threshold=2)
+    for _ in range(4):
+        bitmaps.task_ids(test_session, "s", TagFilter(all_of=["work"]), 0, 10)
+    for name in ["urgent", "home"]:
+        bitmaps.task_ids(test_session, "s", TagFilter(all_of=[name]), 0, 10)
+    # The one-off tags were forgotten, the hot one kept at half its count.
+    assert bitmaps._hits == {("s", "work"): 2}
+
+
+def test_bitmaps_stay_within_byte_budget(test_session, monkeypatch):
+    sparse = Task(id=80_000, name="Sparse")
+    tags.set_task_tags(test_session, sparse, ["rare"])
+    test_session.add(sparse)
+    test_session.commit()
+    monkeypatch.setattr(tags, "MAX_TAG_BITMAP_BYTES", 1000)
+    bitmaps = TagBitmaps(threshold=1)
+    # A 10 kB bitmap for one task is refused, so the SQL path answers.
+    rare = TagFilter(all_of=["rare"])
+    assert bitmaps.task_ids(test_session, "s", rare, 0, 10) is None
+    assert bitmaps._bitmaps == {}
+    work = TagFilter(all_of=["work"])
+    assert bitmaps.task_ids(test_session, "s", work, 0, 10) == [1, 2, 3]
+
+
+def test_list_tasks_matches_with_and_without_bitmaps(registry, bitmaps):
+    writer = LocalTaskWriter(registry)
+    for i, (name, task_tags) in enumerate(TASKS.items()):
+        writer.create_task(
+            TaskCreate(name=name, tags=task_tags), ["work", "personal"][i % 2]
+        )
+    tag_filter = TagFilter(all_of=["urgent"], none_of=["waiting"])
+    results = [
+        names(shards.list_tasks(registry, tag_filter=tag_filter)) for _ in range(3)
+    ]
+    assert results[0] == results[1] == results[2]
+    assert sorted(results[0]) == ["Buy milk", "Write report"]
+    assert ("work", "urgent") in bitmaps._bitmaps
+
+
+def test_writes_invalidate_bitmaps(registry, bitmaps):
+    writer = LocalTaskWriter(registry)
+    first = writer.create_task(TaskCreate(name="A", tags=["hot"]))
+    tag_filter = TagFilter(all_of=["hot"])
+    for _ in range(2):
+        shards.list_tasks(registry, tag_filter=tag_filter)
+
+    second = writer.create_task(TaskCreate(name="B", tags=["hot"]))
+    listed = shards.list_tasks(registry, tag_filter=tag_filter)
+    assert [t.id for t in listed] == [first.id, second.id]
+
+    writer.update_task(first.id, TaskUpdate(tags=["cold"]))
+    listed = shards.list_tasks(registry, tag_filter=tag_filter)
+    assert [t.id for t in listed] == [second.id]
+
+    writer.delete_task(second.id)
+    assert shards.list_tasks(registry, tag_filter=tag_filter) == []
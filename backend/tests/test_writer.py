@@ -0,0 +1,260 @@
+"""Tests for markado.writer, the single-writer mode used with several workers.
+
+The stress test starts a writer and several worker processes against one
+SQLite file. Each worker writes through the writer and immediately reads its
+own writes back through a read-only connection, as an API worker would.
+
+The failover test runs the whole app in each worker process instead: the
+lifespan elects one of them as the writer, and when that worker is killed or
+shut down another one takes over.
+"""
+
+import multiprocessing
+import queue
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, SQLModel, func, select
+
+from markado import database, shards
+from markado import writer as writer_module
+from markado.app import app
+from markado.database import make_engine
+from markado.models import Task, TaskCreate, TaskUpdate
+from markado.shards import Shard, ShardRegistry
+from markado.writer import WriterClient, WriterError, WriterServer, acquire_writer_lock
+
+AUTHKEY = b"test-key"
+WORKERS = 4
+TASKS_PER_WORKER = 25
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    path = tmp_path / "tasks.db"
+    engine = make_engine(path)
+    SQLModel.metadata.create_all(engine)
+    engine.dispose()
+    return path
+
+
+@pytest.fixture
+def writer(db_file, tmp_path):
+    registry = ShardRegistry([Shard("default", 0, db_file)])
+    server = WriterServer(registry, str(tmp_path / "writer.sock"), AUTHKEY)
+    server.start()
+    yield server
+    server.close()
+    registry.close()
+
+
+def _worker(db_file, address, worker_no):
+    # Runs in a separate process: write via IPC, read via a read-only engine.
+    client = WriterClient(address, AUTHKEY)
+    read_engine = make_engine(db_file, read_only=True)
+    for i in range(TASKS_PER_WORKER):
+        created = client.create_task(TaskCreate(name=f"W{worker_no}-{i}"))
+        with Session(read_engine) as session:
+            fetched = session.get(Task, created.id)
+            assert fetched is not None and fetched.name == f"W{worker_no}-{i}"
+
+        client.update_task(created.id, TaskUpdate(complete=True))
+        with Session(read_engine) as session:
+            fetched = session.get(Task, created.id)
+            assert fetched is not None and fetched.complete is True
+    client.close()
+    read_engine.dispose()
+
+
+def test_writer_stress_several_workers(db_file, writer):
+    ctx = multiprocessing.get_context("spawn")
+    processes = [
+        ctx.Process(target=_worker, args=(db_file, writer.address, n))
+        for n in range(WORKERS)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+
+    assert [p.exitcode for p in processes] == [0] * WORKERS
+
+    engine = make_engine(db_file, read_only=True)
+    with Session(engine) as session:
+        total = session.exec(select(func.count()).select_from(Task)).one()
+        complete = session.exec(
+            select(func.count()).select_from(Task).where(Task.complete)
+        ).one()
+    engine.dispose()
+    assert total == WORKERS * TASKS_PER_WORKER
+    assert complete == WORKERS * TASKS_PER_WORKER
+
+
+def _app_worker(tmp_path, commands, results):
+    # Runs in a separate process: an API worker with WRITER_MODE=ipc, serving
+    # one vault shard. Each command creates a task and reads it back.
+    database.engine = make_engine(tmp_path / "default.db")
+    shards.WRITER_MODE = writer_module.WRITER_MODE = "ipc"
+    shards.SHARD_DIR = tmp_path / "shards"
+    writer_module.WRITER_ADDRESS = str(tmp_path / "writer.sock")
+    writer_module.WRITER_LOCK_PATH = str(tmp_path / "writer.lock")
+    registry = ShardRegistry()
+    # As default_registry does in ipc mode: the elected writer migrates.
+    registry.add_vault(tmp_path / "work", migrate=False)
+    shards._registry = registry
+
+    with TestClient(app) as client:
+        results.put(("ready", writer_module._server is not None))
+        for name in iter(commands.get, None):
+            response = client.post("/tasks/", json={"name": name})
+            if response.status_code != 200:
+                results.put(("error", response.text))
+                continue
+            task_id = response.json()["id"]
+            fetched = client.get(f"/tasks/{task_id}").json()
+            results.put((fetched["name"], writer_module._server is not None))
+    # Linger after the lifespan shutdown, as a worker finishing other requests
+    # would, until told to exit.
+    results.put(("stopped", False))
+    commands.get()
+
+
+def test_writer_failover_between_app_workers(tmp_path):
+    ctx = multiprocessing.get_context("spawn")
+    workers = []
+
+    def write(worker, name: str) -> bool:
+        _, commands, results = worker
+        commands.put(name)
+        try:
+            fetched, is_writer = results.get(timeout=30)
+        except queue.Empty:
+            pytest.fail(f"No reply for {name}")
+        assert fetched == name
+        return is_writer
+
+    try:
+        for n in range(3):
+            commands, results = ctx.Queue(), ctx.Queue()
+            process = ctx.Process(
+                target=_app_worker, args=(tmp_path, commands, results), daemon=True
+            )
+            process.start()
+            workers.append((process, commands, results))
+            # Started one at a time, so the first worker is elected.
+            assert results.get(timeout=60) == ("ready", n == 0)
+
+        first, second, third = workers
+        elected = [write(w, f"T{n}") for n, w in enumerate(workers)]
+        assert elected == [True, False, False]
+
+        # Kill the writer: a survivor takes the lock and keeps serving writes.
+        first[0].kill()
+        first[0].join()
+        leaders = [write(second, "after kill"), write(third, "after kill")]
+        assert sorted(leaders) == [False, True]
+
+        # Shut the new writer down through its lifespan. While its process is
+        # still alive, the last worker must stop using it and take over.
+        leader, survivor = (second, third) if leaders[0] else (third, second)
+        leader[1].put(None)
+        assert leader[2].get(timeout=30) == ("stopped", False)
+        assert write(survivor, "after shutdown") is True
+        for process, commands, _ in (leader, survivor):
+            commands.put(None)
+            commands.put(None)
+            process.join(timeout=30)
+            assert process.exitcode == 0
+    finally:
+        for process, _, _ in workers:
+            if process.is_alive():
+                process.kill()
+                process.join()
+
+    engine = make_engine(tmp_path / "shards" / "work.db", read_only=True)
+    with Session(engine) as session:
+        names = session.exec(select(Task.name).order_by(Task.id)).all()
+    engine.dispose()
+    assert names == [
+        "T0",
+        "T1",
+        "T2",
+        "after kill",
+        "after kill",
+        "after shutdown",
+    ]
+
+
+def test_writer_update_and_delete_missing_task(writer):
+    client = WriterClient(writer.address, AUTHKEY)
+    assert client.update_task(42, TaskUpdate(name="nope")) is None
+    assert client.delete_task(42) is False
+    client.close()
+
+
+def test_writer_reports_errors(writer):
+    client = WriterClient(writer.address, AUTHKEY)
+    with pytest.raises(WriterError):
+        client._call("drop_everything", {})
+    client.close()
+
+
+def test_writer_client_resend_failure(writer, monkeypatch):
+    client = WriterClient(writer.address, AUTHKEY)
+
+    def broken_pipe(message):
+        raise BrokenPipeError
+
+    monkeypatch.setattr(client, "_send", broken_pipe)
+    with pytest.raises(WriterError):
+        client.delete_task(1)
+    assert client._conn is None
+
+
+def test_closed_writer_drops_clients_which_fail_over(db_file, writer):
+    registry = ShardRegistry([Shard("default", 0, db_file)])
+    successors: list[WriterServer] = []
+
+    def elect() -> None:
+        # What markado.writer._elect does in a surviving worker.
+        if not successors:
+            successors.append(WriterServer(registry, writer.address, AUTHKEY))
+            successors[0].start()
+
+    client = WriterClient(writer.address, AUTHKEY, on_connect_failure=elect)
+    client.create_task(TaskCreate(name="Before"))
+    writer.close()
+    # The old connection is cut, so the send fails and the client reconnects
+    # to the newly elected writer instead of losing the request.
+    created = client.create_task(TaskCreate(name="After"))
+    assert created.name == "After" and successors
+    client.close()
+    successors[0].close()
+    registry.close()
+
+
+def test_writer_client_unreachable(tmp_path):
+    client = WriterClient(str(tmp_path / "none.sock"), AUTHKEY, connect_timeout=0.1)
+    with pytest.raises(WriterError):
+        client.delete_task(1)
+
+
+def test_read_only_engine_rejects_writes(db_file):
+    engine = make_engine(db_file, read_only=True)
+    with Session(engine) as session:
+        session.add(Task(name="sneaky"))
+        with pytest.raises(OperationalError):
+            session.commit()
+    engine.dispose()
+
+
+def test_writer_lock_is_exclusive(tmp_path):
+    lock_path = str(tmp_path / "writer.lock")
+    first = acquire_writer_lock(lock_path)
+    assert first is not None
+    assert acquire_writer_lock(lock_path) is None
+    first.close()
+    second = acquire_writer_lock(lock_path)
+    assert second is not None
+    second.close()